@@ -0,0 +1,339 @@
+import json
+import time
+import asyncio
+from dataclasses import dataclass, field
+from functools import cache
+from typing import (
+  Any,
+  TypedDict,
+  Sequence,
+  Annotated,
+  Callable,
+  Protocol
+)
+
+from langgraph.runtime import get_runtime
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+  BaseMessage,
+  SystemMessage,
+  HumanMessage,
+  ToolMessage,
+  AIMessage
+)
+from langgraph.graph.message import add_messages
+from langgraph.graph import (
+  StateGraph, 
+  END, 
+  START
+)
+from langgraph.graph.state import CompiledStateGraph
+
+from cache import ResponseCache, model_id
+from memory import (
+  get_checkpointer,
+  prompt_window,
+  removals,
+  shorten,
+  split_for_summary,
+  summary_prompt,
+  token_counter,
+  turn_start,
+  turns
+)
+from masking import Masker, get_analyzer, get_morph
+import tools
+
+from config import (
+  HISTORY_SUMMARIZE_AFTER,
+  LLM_CACHE_SIZE,
+  LLM_CACHE_TTL,
+  LLM_MODEL,
+  PROMPT_MAX_TOKENS,
+  SYSTEM_PROMPT,
+  TOOL_RESULT_MAX_CHARS
+)
+from metrics import metrics
+
+
+@dataclass
+class Step:
+  ''' Шаг хода агента. kind – text, model, model_json или tool; data – его поля. '''
+  title: str
+  icon: str
+  kind: str
+  data: dict[str, Any]
+  at: float = field(default_factory=time.perf_counter)
+
+
+class StepSink(Protocol):
+  def add(self, step: Step):
+    pass
+
+
+class NullSteps:
+  def add(self, step: Step):
+    pass
+
+
+class StepTrace:
+  ''' Собирает шаги хода для ответа API. '''
+  def __init__(self):
+    self.start = time.perf_counter()
+    self.steps: list[Step] = []
+
+
+  def add(self, step: Step):
+    self.steps.append(step)
+
+
+  def as_list(self) -> list[dict]:
+    return [
+      {'title': s.title, 'kind': s.kind, 'seconds': s.at - self.start, **s.data}
+      for s in self.steps
+    ]
+
+
+@dataclass
+class Context:
+  llm: BaseChatModel
+  masker: Masker
+  steps: StepSink
+  summarizer: BaseChatModel | None = None
+  tool_names: tuple[str, ...] = ()
+  response_cache: ResponseCache | None = None
+  on_compendium: Callable[[], None] | None = None
+
+
+  def compendium_changed(self):
+    if self.on_compendium:
+      self.on_compendium()
+
+
+class AgentState(TypedDict):
+  messages: Annotated[Sequence[BaseMessage], add_messages]
+  summary: str
+  answer: str
+
+
+@metrics.timed('node', node='mask')
+async def mask(state: AgentState) -> AgentState:
+  runtime = get_runtime(Context)
+  # Предыдущие ходы уже лежат в чекпоинте в замаскированном виде,
+  # маскируем только новый запрос
+  request = state['messages'][turn_start(state['messages'])]
+  # Анализатор – работа на CPU: в потоке она не держит цикл событий других сессий
+  request.content = await asyncio.to_thread(runtime.context.masker.mask, request.content)
+  runtime.context.steps.add(Step(
+    title='Маскирую запрос', 
+    icon='ti-lock',
+    kind='text',
+    data={'text': request.content}
+  ))
+  runtime.context.compendium_changed()
+  
+  return {'messages': [request]}
+
+
+@metrics.timed('node', node='unmask')
+async def unmask(state: AgentState) -> AgentState:
+  runtime = get_runtime(Context)
+  response = await asyncio.to_thread(
+    runtime.context.masker.unmask,
+    state['messages'][-1].content
+  )
+  runtime.context.steps.add(Step(
+    title='Снимаю маски', 
+    icon='ti-unlock',
+    kind='text',
+    data={'text': response}
+  ))
+  # Открытый ответ в историю не попадает: там остаётся замаскированный
+  return {'answer': response}
+
+
+@metrics.timed('node', node='summarize')
+async def summarize(thread_id: str, summarizer: BaseChatModel):
+  ''' Пересказывает старую часть истории треда. Идёт после ответа, а не в ходе:
+  пользователь лишнего вызова модели не ждёт.
+  '''
+  graph = get_graph()
+  config = {'configurable': {'thread_id': thread_id}}
+  state = (await graph.aget_state(config)).values
+  old, _ = split_for_summary(list(state['messages']))
+  if not old:
+    return
+  response = await summarizer.ainvoke(summary_prompt(state.get('summary', ''), old))
+  await graph.aupdate_state(
+    config,
+    {'summary': response.text(), 'messages': removals(old)},
+    as_node='unmasker'
+  )
+
+
+def needs_summary(state: AgentState) -> bool:
+  return len(state['messages']) > HISTORY_SUMMARIZE_AFTER
+
+
+# Пересказы, которые ещё идут, по thread_id
+summaries: dict[str, asyncio.Task] = {}
+
+
+def schedule_summary(thread_id: str, summarizer: BaseChatModel):
+  task = summaries[thread_id] = asyncio.create_task(summarize(thread_id, summarizer))
+
+  def done(task: asyncio.Task):
+    if summaries.get(thread_id) is task:
+      del summaries[thread_id]
+    if not task.cancelled() and (e := task.exception()) is not None:
+      print(f'history summary failed for thread {thread_id}: {e!r}')
+  task.add_done_callback(done)
+
+
+@metrics.timed('node', node='llm')
+async def call_model(state: AgentState) -> AgentState:
+  runtime = get_runtime(Context)
+  system_promt = SystemMessage(content=SYSTEM_PROMPT)
+  prompt = [system_promt]
+  if summary := state.get('summary'):
+    prompt.append(SystemMessage(content=f'Краткое содержание предыдущего разговора: {summary}'))
+  counter = token_counter()
+  prompt += prompt_window(list(state['messages']), PROMPT_MAX_TOKENS - counter(prompt), counter)
+  metrics.observe('prompt', counter(prompt), unit='tokens', model=LLM_MODEL)
+
+  response = None
+  if cache := runtime.context.response_cache:
+    key = cache.key(model_id(runtime.context.llm), runtime.context.tool_names, prompt)
+    response = cache.get(key, runtime.context.masker.comp)
+    metrics.observe('llm_cache', float(response is not None), unit='hits', model=LLM_MODEL)
+  if response is None:
+    with metrics.span('llm_call', model=LLM_MODEL):
+      response = await runtime.context.llm.ainvoke(prompt)
+    if response.usage_metadata:
+      # Точное число по данным провайдера, если он его сообщает
+      metrics.observe('prompt_reported', response.usage_metadata['input_tokens'], unit='tokens', model=LLM_MODEL)
+    if cache:
+      cache.put(key, response)
+  if response.tool_calls:
+    answer = json.dumps(response.tool_calls, indent=2)
+    runtime.context.steps.add(Step(
+      title='Вызываю модель',
+      icon='ti-wand',
+      kind='model_json',
+      data={'text': answer}
+    ))      
+  else:
+    runtime.context.steps.add(Step(
+      title='Вызываю модель',
+      icon='ti-wand',
+      kind='model',
+      data={'text': response.text()}
+    ))
+  
+  return {'messages': [response]}   
+
+
+@metrics.timed('node', node='tools')
+async def call_tool(state: AgentState):
+  runtime = get_runtime(Context)
+  tools_by_name = {tool.name: tool for tool in tools.tools}
+  outputs = []
+  for tool_call in state["messages"][-1].tool_calls:
+    tool_result = await tools_by_name[tool_call['name']].ainvoke(tool_call['args'])
+
+    tool_name = tools_by_name[tool_call["name"]].name
+    runtime.context.steps.add(Step(
+      title='Вызываю инструмент',
+      icon='ti-plug',
+      kind='tool',
+      data={'name': tool_name, 'args': tool_call["args"], 'result': tool_result}
+    ))
+      
+    outputs.append(
+      ToolMessage(
+        content=shorten(json.dumps(tool_result, ensure_ascii=False), TOOL_RESULT_MAX_CHARS),
+        name=tool_call["name"],
+        tool_call_id=tool_call["id"],
+      )
+    )
+
+  # Update the compendium anyway
+  runtime.context.compendium_changed()
+  return {"messages": outputs}
+
+
+async def carry_on(state: AgentState) -> bool:
+  messages = state["messages"]
+  last_message = messages[-1]
+
+  # Если последнее сообщение от AI и содержит вызовы инструментов - продолжаем
+  if isinstance(last_message, AIMessage) and last_message.tool_calls:
+    return True
+
+  # Иначе заканчиваем
+  return False
+
+
+# Общий для всех сессий: после маскирования их промпты часто совпадают
+response_cache = ResponseCache(LLM_CACHE_SIZE, LLM_CACHE_TTL) if LLM_CACHE_SIZE else None
+
+
+def build_graph() -> StateGraph:
+  graph = StateGraph(AgentState)
+  graph.add_node('masker', mask)
+  graph.add_node('unmasker', unmask)
+  graph.add_node('llm', call_model)
+  graph.add_node('tools', call_tool)
+
+  graph.add_edge(START, 'masker')
+  graph.add_edge('masker', 'llm')
+  graph.add_conditional_edges(
+    'llm', carry_on, {True: 'tools', False: 'unmasker'}
+  )
+
+  graph.add_edge('tools', 'llm')
+  graph.add_edge('unmasker', END)
+  return graph
+
+
+async def prewarm():
+  ''' Загружает модель spaCy, словари pymorphy3 и tiktoken в потоках при старте сервера.
+  Импорты ленивые, и без этого загрузка шла бы в первом ходе, держа цикл событий всех сессий.
+  '''
+  await asyncio.to_thread(get_analyzer)
+  await asyncio.to_thread(get_morph)
+  await asyncio.to_thread(token_counter)
+
+
+@cache
+def get_graph() -> CompiledStateGraph:
+  ''' Скомпилированный граф на процесс: его делят страницы ngui и запросы API. '''
+  return build_graph().compile(checkpointer=get_checkpointer())
+
+
+async def ask(
+  message: str,
+  thread_id: str,
+  context: Context
+) -> str:
+  ''' Один ход агента: маскирование, модель и инструменты, снятие масок.
+  Возвращает открытый ответ. История хода сохраняется в чекпоинте под thread_id;
+  если она разрослась, после ответа запускается её пересказ.
+  '''
+  # Ход начинается с истории, в которой пересказ уже применён
+  if pending := summaries.get(thread_id):
+    await asyncio.wait({pending})
+  result = await get_graph().ainvoke(
+    input={'messages': [HumanMessage(content=message)]},
+    config={'configurable': {'thread_id': thread_id}},
+    context=context
+  )
+  if context.summarizer is not None and needs_summary(result):
+    schedule_summary(thread_id, context.summarizer)
+  return result['answer']
+
+
+async def history(thread_id: str) -> list[tuple[str, str | None]]:
+  ''' Ходы треда из чекпоинта в замаскированном виде, см. memory.turns. '''
+  state = await get_graph().aget_state({'configurable': {'thread_id': thread_id}})
+  return turns(list(state.values.get('messages', [])))
@@ -0,0 +1,176 @@
+import time
+import uuid
+import asyncio
+from functools import cache
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import PlainTextResponse
+from langchain_core.language_models import BaseChatModel
+from pydantic import BaseModel
+
+import agent
+import tools
+from agent import Context, NullSteps, StepTrace
+from cache import TTLCache
+from compendium import Compendium
+from llm import get_llm
+from masking import Masker, check_entities
+from memory import PromptTooLong
+from persistence import get_store, open_compendium
+from metrics import metrics, PrometheusSink, RingBufferSink
+
+from config import (
+  API_CONCURRENCY,
+  API_HOST,
+  API_PORT,
+  API_QUEUE,
+  API_SESSIONS,
+  API_SESSION_TTL,
+  LLM_MODEL,
+  METRICS_SINKS,
+  PII_ENTITIES
+)
+
+
+metrics.configure(METRICS_SINKS)
+
+
+class AskRequest(BaseModel):
+  message: str
+  thread_id: str | None = None
+  trace: bool = False
+  # Сущности Presidio для маскирования; по умолчанию PII_ENTITIES
+  entities: list[str] | None = None
+
+
+class AskResponse(BaseModel):
+  answer: str
+  thread_id: str
+  timing: dict[str, float]
+  trace: list[dict] | None = None
+
+
+class Admission:
+  ''' Одновременно выполняются не больше concurrency запросов, ещё не больше queue ждут
+  своей очереди; остальные сразу получают 429, а не копятся в памяти.
+  '''
+  def __init__(self, concurrency: int, queue: int):
+    self.slots = asyncio.Semaphore(concurrency)
+    self.limit = concurrency + queue
+    self.inflight = 0
+
+
+  @asynccontextmanager
+  async def admit(self):
+    if self.inflight >= self.limit:
+      raise HTTPException(429, 'Слишком много запросов', headers={'Retry-After': '1'})
+    self.inflight += 1
+    try:
+      async with self.slots:
+        yield
+    finally:
+      self.inflight -= 1
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+  # Модель spaCy и словари грузятся до первого запроса, а не в нём
+  await agent.prewarm()
+  yield
+
+
+app = FastAPI(title='multifora', lifespan=lifespan)
+admission = Admission(API_CONCURRENCY, API_QUEUE)
+# Компендиум на сессию: токены из истории разговора должны сниматься и в следующих ходах
+sessions = TTLCache(API_SESSIONS, API_SESSION_TTL)
+
+
+@cache
+def get_model() -> BaseChatModel:
+  return get_llm(LLM_MODEL).bind_tools(tools.tools)
+
+
+async def session_compendium(thread_id: str) -> Compendium:
+  ''' Компендиум сессии. Без хранилища компендиум живёт только в памяти: если он истёк,
+  а история треда в чекпоинте осталась, её токены не раскрыть, и такая сессия не продолжается.
+  '''
+  if (comp := sessions.get(thread_id)) is None:
+    if get_store() is None and await agent.history(thread_id):
+      raise HTTPException(410, 'Сессия истекла: начните новую без thread_id')
+    comp = open_compendium(thread_id)
+  # put продлевает время жизни сессии
+  sessions.put(thread_id, comp)
+  return comp
+
+
+def node_timing(tid: str) -> dict[str, float]:
+  timing: dict[str, float] = {}
+  if sink := metrics.sink(RingBufferSink):
+    for s in sink.trace(tid):
+      if s.name == 'node':
+        key = f'node_{s.labels["node"]}'
+        timing[key] = timing.get(key, 0.0) + s.value
+  return timing
+
+
+@app.post('/v1/ask')
+async def ask(request: AskRequest, response: Response) -> AskResponse:
+  ''' Один ход агента: запрос маскируется, модель видит только токены, ответ возвращается открытым. '''
+  received = time.perf_counter()
+  # Пустой список – ошибка (422), а не «все сущности по умолчанию»
+  entities = PII_ENTITIES if request.entities is None else request.entities
+  try:
+    check_entities(entities)
+  except ValueError as e:
+    raise HTTPException(422, str(e))
+  async with admission.admit():
+    started = time.perf_counter()
+    thread_id = request.thread_id or uuid.uuid4().hex
+    comp = await session_compendium(thread_id)
+    # Инструменты работают с компендиумом этой сессии
+    tools.current_comp.set(comp)
+    tid = metrics.start_trace()
+    steps = StepTrace() if request.trace else NullSteps()
+    llm = get_model()
+    try:
+      answer = await agent.ask(
+        request.message,
+        thread_id=thread_id,
+        context=Context(
+          llm=llm,
+          masker=Masker(comp=comp, entities=entities),
+          steps=steps,
+          summarizer=llm,
+          tool_names=tuple(t.name for t in tools.tools),
+          response_cache=agent.response_cache
+        )
+      )
+    except PromptTooLong as e:
+      raise HTTPException(413, str(e))
+    finished = time.perf_counter()
+
+  timing = {
+    'queued': started - received,
+    'run': finished - started,
+    **node_timing(tid),
+  }
+  response.headers['Server-Timing'] = ', '.join(f'{k};dur={v * 1000:.1f}' for k, v in timing.items())
+  response.headers['X-Trace-Id'] = tid
+  return AskResponse(
+    answer=answer,
+    thread_id=thread_id,
+    timing=timing,
+    trace=steps.as_list() if request.trace else None,
+  )
+
+
+@app.get('/metrics')
+def prometheus_metrics() -> PlainTextResponse:
+  sink = metrics.sink(PrometheusSink)
+  return PlainTextResponse(sink.render() if sink else '')
+
+
+if __name__ == '__main__':
+  import uvicorn
+  uvicorn.run(app, host=API_HOST, port=API_PORT)
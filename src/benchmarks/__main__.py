@@ -0,0 +1,65 @@
+import sys
+import json
+import argparse
+import platform
+import importlib
+import subprocess
+import contextlib
+from os import devnull
+from datetime import datetime, UTC
+
+
+BENCHMARKS = [
+  'masking_throughput',
+  'reconstruct',
+  'tool_lookups',
+  'agent_loop',
+  'calendar_parse',
+  'load',
+  'startup',
+  'persistence',
+  'token_ids',
+]
+
+
+def commit() -> str | None:
+  try:
+    return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True).strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Бенчмарки multifora')
+  parser.add_argument('names', nargs='*', help=f'по умолчанию все: {", ".join(BENCHMARKS)}')
+  parser.add_argument('--quick', action='store_true', help='меньше повторов')
+  parser.add_argument('--out', help='файл для результатов в JSON')
+  args = parser.parse_args()
+  if unknown := set(args.names) - set(BENCHMARKS):
+    parser.error(f'unknown benchmarks: {", ".join(sorted(unknown))}')
+
+  results = {}
+  for name in args.names or BENCHMARKS:
+    module = importlib.import_module(f'benchmarks.{name}')
+    print(f'running {name}...', file=sys.stderr)
+    # Инструменты и узлы графа печатают отладку в stdout
+    with open(devnull, 'w') as null, contextlib.redirect_stdout(null):
+      results[name] = module.run(quick=args.quick)
+
+  report = {
+    'commit': commit(),
+    'python': platform.python_version(),
+    'timestamp': datetime.now(UTC).isoformat(),
+    'quick': args.quick,
+    'results': results,
+  }
+  if args.out:
+    with open(args.out, 'w', encoding='utf-8') as f:
+      json.dump(report, f, ensure_ascii=False, indent=2)
+  else:
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,60 @@
+import uuid
+import asyncio
+
+from nicegui import Client, ui, core
+from nicegui.page import page
+
+import tools
+from fake_llm import FakeChatModel
+
+from benchmarks.corpus import FIRST_NAMES, LAST_NAMES
+from benchmarks.harness import ameasure
+
+
+async def arun(quick: bool = False) -> dict:
+  import ngui
+  import agent
+
+  # Без ui.run цикл событий NiceGUI не задан, а он нужен для run_javascript
+  core.loop = asyncio.get_running_loop()
+
+  with Client(page('/'), request=None):
+    feed = ui.column()
+    text = ui.input()
+  service = ngui.Service(feed, text, llm=FakeChatModel())
+  service.response_cache = None
+  for t in tools.tools:
+    service.connect_tool(True, t)
+
+  p1, p2 = f'{FIRST_NAMES[1]} {LAST_NAMES[4]}', f'{FIRST_NAMES[2]} {LAST_NAMES[5]}'
+  tools.db['age'][service.masker._lemmatize(p1)] = 50
+  tools.db['age'][service.masker._lemmatize(p2)] = 40
+
+  async def turn():
+    text.value = f'Кто старше {p1} или {p2}?'
+    with feed:
+      await service.invoke()
+
+  repeat = 5 if quick else 50
+  results = {'invoke': await ameasure(turn, repeat)}
+
+  # Каждый ход в новой сессии: промпты совпадают с точностью до токенов
+  # и после первого хода отвечает кэш
+  service.response_cache = agent.response_cache
+  service.response_cache.clear()
+
+  async def fresh_turn():
+    service.thread_id = uuid.uuid4().hex
+    await turn()
+
+  results['invoke_cached'] = await ameasure(fresh_turn, repeat)
+  results['llm_cache'] = {
+    'hits': service.response_cache.hits,
+    'misses': service.response_cache.misses,
+  }
+  service.response_cache.clear()
+  return results
+
+
+def run(quick: bool = False) -> dict:
+  return asyncio.run(arun(quick))
@@ -0,0 +1,130 @@
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from os import path
+from datetime import datetime, timedelta, timezone
+
+from calendar_event import CalendarEvent
+from calendar_parse import parse_events
+
+
+SUMMARIES = [
+  'Планёрка', 'Созвон с командой', 'Обед', 'Ревью кода', 'Встреча с заказчиком',
+  'Спортзал', 'Английский', 'Демо спринта', 'Один на один', 'Ретроспектива',
+]
+LOCATIONS = ['Москва', 'Тверь', 'Тюмень', 'Переговорная 1', 'Переговорная 2', 'Онлайн', '']
+
+
+def make_fixture(n: int, seed: int = 42) -> list[dict]:
+  rnd = random.Random(seed)
+  base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+  items = []
+  for i in range(n):
+    start = base + timedelta(days=rnd.randrange(365), hours=rnd.randrange(8, 20))
+    end = start + timedelta(minutes=rnd.choice([30, 60, 90]))
+    updated = base + timedelta(seconds=rnd.randrange(365 * 24 * 3600))
+    item = {
+      'id': f'evt{i:06d}',
+      # Строки создаются заново, как после json.loads
+      'summary': ''.join(rnd.choice(SUMMARIES)),
+      'description': f'Описание события {i}',
+      'location': ''.join(rnd.choice(LOCATIONS)),
+      'start': {'dateTime': start.isoformat()},
+      'end': {'dateTime': end.isoformat()},
+      'updated': updated.isoformat().replace('+00:00', 'Z'),
+    }
+    if rnd.random() < 0.1:
+      item['recurrence'] = ['RRULE:FREQ=WEEKLY;COUNT=10']
+    items.append(item)
+  return items
+
+
+def parse_naive(items: list[dict]) -> dict[str, CalendarEvent]:
+  # Прежний путь из GoogleCalendar.fetch_events
+  events = {}
+  for event in items:
+    start = event['start'].get('dateTime') or event['start'].get('date')
+    end = event['end'].get('dateTime') or event['end'].get('date')
+    recurrence = event.get('recurrence', [])
+    events[event['id']] = CalendarEvent(
+      uid=event['id'],
+      summary=event.get('summary', ''),
+      dtstart=datetime.fromisoformat(start).astimezone(timezone.utc),
+      dtend=datetime.fromisoformat(end).astimezone(timezone.utc),
+      last_modified=datetime.fromisoformat(event.get('updated')).astimezone(timezone.utc),
+      description=event.get('description', ''),
+      location=event.get('location', ''),
+      rrule=recurrence[0].removeprefix('RRULE:') if recurrence else ''
+    )
+  return events
+
+
+def measure(name: str, fn, fixture: str) -> dict:
+  def load():
+    with open(fixture, encoding='utf-8') as f:
+      return json.load(f)
+
+  items = load()
+  gc.collect()
+  start = time.perf_counter()
+  events = fn(items)
+  seconds = time.perf_counter() - start
+
+  # Память считаем после того, как исходный JSON больше не нужен:
+  # остаются только события и строки, на которые они ссылаются
+  del events, items
+  gc.collect()
+  tracemalloc.start()
+  items = load()
+  events = fn(items)
+  del items
+  gc.collect()
+  current, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+
+  return {
+    'name': name,
+    'events': len(events),
+    'seconds': round(seconds, 4),
+    'events_per_sec': round(len(events) / seconds),
+    'retained_bytes': current,
+    'peak_bytes': peak,
+    'bytes_per_event': round(current / len(events)),
+  }
+
+
+def run(quick: bool = False, n: int | None = None, fixture: str | None = None) -> dict:
+  n = n or (5_000 if quick else 50_000)
+  if fixture is None:
+    fixture = path.join(tempfile.gettempdir(), f'multifora_events_{n}.json')
+    if not path.exists(fixture):
+      with open(fixture, 'w', encoding='utf-8') as f:
+        json.dump(make_fixture(n), f, ensure_ascii=False)
+
+  return {
+    'fixture': fixture,
+    'results': [
+      measure('naive', parse_naive, fixture),
+      measure('parse_events', parse_events, fixture),
+      measure('parse_events_no_intern', lambda items: parse_events(items, intern=False), fixture),
+    ],
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Разбор событий календаря')
+  parser.add_argument('-n', type=int, default=50_000)
+  parser.add_argument('--fixture', help='JSON со списком событий; по умолчанию генерируется')
+  args = parser.parse_args()
+
+  json.dump({'benchmark': 'calendar_parse', **run(n=args.n, fixture=args.fixture)}, sys.stdout, indent=2)
+  print()
+
+
+if __name__ == '__main__':
+  main()
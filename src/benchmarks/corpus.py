@@ -0,0 +1,39 @@
+import random
+
+
+FIRST_NAMES = [
+  'Иван', 'Пётр', 'Александр', 'Аркадий', 'Борис', 'Демьян', 'Мария', 'Анна',
+  'Елена', 'Ольга', 'Сергей', 'Николай', 'Татьяна', 'Дмитрий', 'Наталья', 'Михаил',
+]
+LAST_NAMES = [
+  'Иванов', 'Петров', 'Сидоров', 'Стругацкий', 'Емельянов', 'Митрофанов', 'Смирнов',
+  'Кузнецов', 'Попов', 'Соколов', 'Лебедев', 'Козлов', 'Новиков', 'Морозов',
+]
+CITIES = ['Москва', 'Тверь', 'Тюмень', 'Казань', 'Самара', 'Омск', 'Пермь', 'Воронеж']
+
+TEMPLATES = [
+  'Кто старше {p1} или {p2}?',
+  'Какие отношения были между {p1} и {p2}?',
+  'Напомни {p1}, что встреча в городе {c1} переносится на завтра.',
+  'Сравни площадь городов {c1} и {c2}.',
+  '{p1} переехал из города {c1} в {c2} и теперь работает вместе с {p2}.',
+  'Отправь письмо {p1} и {p2} с итогами поездки в {c1}.',
+]
+
+
+def person(rnd: random.Random) -> str:
+  return f'{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}'
+
+
+def sentences(n: int, seed: int = 42) -> list[str]:
+  rnd = random.Random(seed)
+  return [
+    rnd.choice(TEMPLATES).format(
+      p1=person(rnd), p2=person(rnd), c1=rnd.choice(CITIES), c2=rnd.choice(CITIES)
+    )
+    for _ in range(n)
+  ]
+
+
+def document(n: int, seed: int = 42) -> str:
+  return ' '.join(sentences(n, seed))
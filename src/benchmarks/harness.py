@@ -0,0 +1,40 @@
+import time
+import statistics
+from typing import Awaitable, Callable
+
+
+def summarize(samples: list[float]) -> dict:
+  ordered = sorted(samples)
+  def q(p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+  return {
+    'runs': len(samples),
+    'mean': statistics.fmean(samples),
+    'p50': q(0.5),
+    'p95': q(0.95),
+    'p99': q(0.99),
+    'min': ordered[0],
+    'max': ordered[-1],
+  }
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 1) -> dict:
+  for _ in range(warmup):
+    fn()
+  samples = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    fn()
+    samples.append(time.perf_counter() - start)
+  return summarize(samples)
+
+
+async def ameasure(fn: Callable[[], Awaitable[object]], repeat: int, warmup: int = 1) -> dict:
+  for _ in range(warmup):
+    await fn()
+  samples = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    await fn()
+    samples.append(time.perf_counter() - start)
+  return summarize(samples)
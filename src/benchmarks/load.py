@@ -0,0 +1,157 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import contextlib
+from os import devnull
+
+from nicegui import Client, core
+from nicegui.page import page
+
+import tools
+from fake_llm import FakeChatModel
+
+from benchmarks.corpus import FIRST_NAMES, LAST_NAMES
+from benchmarks.harness import summarize
+
+
+def rss_bytes() -> int:
+  try:
+    with open('/proc/self/statm') as f:
+      return int(f.read().split()[1]) * resource.getpagesize()
+  except OSError:
+    # ru_maxrss – пиковое значение, в килобайтах на Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def watch_loop_lag(lags: list[float], stop: asyncio.Event, interval: float = 0.01):
+  while not stop.is_set():
+    start = time.perf_counter()
+    await asyncio.sleep(interval)
+    lags.append(max(0.0, time.perf_counter() - start - interval))
+
+
+async def simulate_client(service, messages: int, think: float, latencies: list[float]):
+  p1, p2 = f'{FIRST_NAMES[1]} {LAST_NAMES[4]}', f'{FIRST_NAMES[2]} {LAST_NAMES[5]}'
+  for _ in range(messages):
+    service.input_element.value = f'Кто старше {p1} или {p2}?'
+    start = time.perf_counter()
+    with service.container:
+      await service.invoke()
+    latencies.append(time.perf_counter() - start)
+    if think:
+      await asyncio.sleep(think)
+
+
+async def arun(
+  clients: int = 20,
+  messages: int = 5,
+  think: float = 0.0,
+  latency: str = 'lognormal',
+  latency_mean: float = 0.5,
+  latency_spread: float = 0.3,
+  cache: bool = False,
+) -> dict:
+  import ngui
+  import agent
+
+  # Без ui.run цикл событий NiceGUI не задан, а он нужен для run_javascript
+  core.loop = asyncio.get_running_loop()
+
+  llm = FakeChatModel(
+    latency=latency,
+    latency_mean=latency_mean,
+    latency_spread=latency_spread,
+    seed=42,
+  )
+
+  rss_before = rss_bytes()
+  opened = []
+  start = time.perf_counter()
+  for _ in range(clients):
+    client = Client(page('/'), request=None)
+    with client:
+      await ngui.page_layout()
+    service = ngui.services[client.id]
+    service.llm = service.summarizer = llm
+    # Без кэша ответов нагрузка идёт на граф и модель, а не на словарь
+    service.response_cache = agent.response_cache if cache else None
+    for t in tools.tools:
+      service.connect_tool(True, t)
+    opened.append((client, service))
+  open_seconds = time.perf_counter() - start
+  rss_opened = rss_bytes()
+
+  masker = opened[0][1].masker
+  for p in (f'{FIRST_NAMES[1]} {LAST_NAMES[4]}', f'{FIRST_NAMES[2]} {LAST_NAMES[5]}'):
+    tools.db['age'][masker._lemmatize(p)] = 40 + len(p)
+
+  latencies: list[float] = []
+  lags: list[float] = []
+  stop = asyncio.Event()
+  watcher = asyncio.create_task(watch_loop_lag(lags, stop))
+
+  start = time.perf_counter()
+  await asyncio.gather(*[
+    simulate_client(service, messages, think, latencies) for _, service in opened
+  ])
+  seconds = time.perf_counter() - start
+
+  stop.set()
+  await watcher
+  rss_after = rss_bytes()
+
+  for client, _ in opened:
+    client.delete()
+  tools.comp.clear()
+
+  return {
+    'clients': clients,
+    'messages_per_client': messages,
+    'fake_latency': {'kind': latency, 'mean': latency_mean, 'spread': latency_spread},
+    'llm_cache': cache,
+    'open_seconds': open_seconds,
+    'seconds': seconds,
+    'turns_per_sec': len(latencies) / seconds,
+    'turn_latency': summarize(latencies),
+    'loop_lag': summarize(lags) if lags else None,
+    'rss_per_session_opened': (rss_opened - rss_before) / clients,
+    'rss_per_session_after_run': (rss_after - rss_before) / clients,
+  }
+
+
+def run(quick: bool = False) -> dict:
+  if quick:
+    return asyncio.run(arun(clients=5, messages=2, latency_mean=0.05, latency_spread=0.02))
+  return asyncio.run(arun())
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Нагрузка на ngui: N клиентов одновременно')
+  parser.add_argument('--clients', type=int, default=20)
+  parser.add_argument('--messages', type=int, default=5, help='сообщений от каждого клиента')
+  parser.add_argument('--think', type=float, default=0.0, help='пауза между сообщениями, с')
+  parser.add_argument('--latency', default='lognormal', choices=['constant', 'uniform', 'lognormal'])
+  parser.add_argument('--latency-mean', type=float, default=0.5)
+  parser.add_argument('--latency-spread', type=float, default=0.3)
+  parser.add_argument('--cache', action='store_true', help='включить кэш ответов модели')
+  args = parser.parse_args()
+
+  with open(devnull, 'w') as null, contextlib.redirect_stdout(null):
+    result = asyncio.run(arun(
+      clients=args.clients,
+      messages=args.messages,
+      think=args.think,
+      latency=args.latency,
+      latency_mean=args.latency_mean,
+      latency_spread=args.latency_spread,
+      cache=args.cache,
+    ))
+  json.dump({'benchmark': 'load', **result}, sys.stdout, indent=2)
+  print()
+
+
+if __name__ == '__main__':
+  main()
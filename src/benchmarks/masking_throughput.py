@@ -0,0 +1,38 @@
+from compendium import Compendium
+from masking import Masker
+
+from benchmarks.corpus import sentences
+from benchmarks.harness import measure
+
+
+PATTERN_ENTITIES = ['EMAIL_ADDRESS', 'PHONE_NUMBER', 'RU_PASSPORT', 'IBAN_CODE']
+
+
+def run(quick: bool = False) -> dict:
+  texts = sentences(50 if quick else 500)
+  chars = sum(len(t) for t in texts)
+  masker = Masker(Compendium())
+
+  def mask_all():
+    for t in texts:
+      masker.mask(t)
+
+  # Только сущности по шаблонам: spaCy не запускается, остаётся токенизатор
+  def mask_patterns():
+    for t in texts:
+      masker.mask(t, PATTERN_ENTITIES)
+
+  stats = measure(mask_all, repeat=1 if quick else 5)
+  patterns = measure(mask_patterns, repeat=1 if quick else 5)
+  return {
+    'texts': len(texts),
+    'chars': chars,
+    'seconds': stats,
+    'texts_per_sec': len(texts) / stats['p50'],
+    'chars_per_sec': chars / stats['p50'],
+    'patterns_only': {
+      'entities': PATTERN_ENTITIES,
+      'seconds': patterns,
+      'texts_per_sec': len(texts) / patterns['p50'],
+    },
+  }
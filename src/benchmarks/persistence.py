@@ -0,0 +1,92 @@
+import time
+import random
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.fernet import Fernet
+
+from compendium import Compendium, Substitution, PIIKind
+from masking import Masker
+from persistence import CompendiumStore
+
+from benchmarks.corpus import person, sentences
+from benchmarks.harness import measure
+
+
+def substitutions(n: int, session: int) -> list[Substitution]:
+  rnd = random.Random(session)
+  return [
+    Substitution(text=(p := person(rnd)), lemma=p, kind=PIIKind.PERSON, token=f'⟪PII:PERSON:{session:04x}{i:04x}⟫')
+    for i in range(n)
+  ]
+
+
+def concurrent_writes(store: CompendiumStore, sessions: int, per_session: int) -> dict:
+  ''' Каждый поток пишет в компендиум своей сессии, как параллельные запросы API. '''
+  batches = [substitutions(per_session, s) for s in range(sessions)]
+
+  def fill(s: int):
+    comp = store.open(f'writes-{s}')
+    for sub in batches[s]:
+      comp.add(sub)
+
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=sessions) as pool:
+    list(pool.map(fill, range(sessions)))
+  # Записи уходят в поток журнала: время – до их попадания на диск
+  store.flush()
+  seconds = time.perf_counter() - start
+  return {
+    'sessions': sessions,
+    'writes': sessions * per_session,
+    'seconds': seconds,
+    'writes_per_sec': sessions * per_session / seconds,
+  }
+
+
+def concurrent_masking(store: CompendiumStore | None, texts: list[str], workers: int) -> float:
+  chunks = [texts[i::workers] for i in range(workers)]
+
+  def mask(i: int):
+    comp = store.open(f'masking-{i}') if store else Compendium()
+    masker = Masker(comp)
+    for t in chunks[i]:
+      masker.mask(t)
+
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=workers) as pool:
+    list(pool.map(mask, range(workers)))
+  return time.perf_counter() - start
+
+
+def run(quick: bool = False) -> dict:
+  sessions = 4 if quick else 16
+  per_session = 200 if quick else 2000
+  texts = sentences(50 if quick else 400)
+  results = {}
+  with tempfile.TemporaryDirectory() as root:
+    store = CompendiumStore(root, [Fernet.generate_key()])
+    results['writes'] = concurrent_writes(store, sessions, per_session)
+
+    # Загрузка одной сессии: снимок плюс хвост журнала
+    size = per_session * sessions
+    comp = store.open('reload')
+    for sub in substitutions(size, 0):
+      comp.add(sub)
+    results['reload'] = {
+      'substitutions': size,
+      'seconds': measure(lambda: store.open('reload'), repeat=3 if quick else 20),
+    }
+
+    # Анализатор загружается до замеров
+    Masker(Compendium()).mask(texts[0])
+    plain = concurrent_masking(None, texts, 4)
+    persisted = concurrent_masking(store, texts, 4)
+    results['masking'] = {
+      'texts': len(texts),
+      'workers': 4,
+      'texts_per_sec_memory': len(texts) / plain,
+      'texts_per_sec_persisted': len(texts) / persisted,
+      'overhead': persisted / plain - 1,
+    }
+  return results
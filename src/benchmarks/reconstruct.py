@@ -0,0 +1,39 @@
+import random
+
+from compendium import Compendium, Substitution, PIIKind
+
+from masking import get_inflector
+
+from benchmarks.corpus import CITIES, person
+from benchmarks.harness import measure
+
+
+SIZES = (10, 100, 1_000, 10_000)
+
+
+def filled(size: int, seed: int = 42) -> Compendium:
+  rnd = random.Random(seed)
+  comp = Compendium()
+  for i in range(size):
+    if i % 2:
+      kind, text = PIIKind.PERSON, person(rnd)
+    else:
+      kind, text = PIIKind.LOCATION, rnd.choice(CITIES)
+    comp.add(Substitution(text=text, lemma=text.lower(), kind=kind, token=comp.make_token(kind)))
+  return comp
+
+
+def run(quick: bool = False) -> dict:
+  results = {}
+  inflected = {}
+  inflector = get_inflector()
+  for size in SIZES[:2] if quick else SIZES:
+    comp = filled(size)
+    # Ответ модели обычно ссылается лишь на несколько токенов
+    tokens = list(comp.dictionary)[-5:]
+    text = ' '.join(f'Известно, что {t} упоминается в ответе.' for t in tokens)
+    results[size] = measure(lambda: comp.reconstruct(text), repeat=20 if quick else 200)
+    # Со склонением: падеж задан предлогом, формы после первого прогона из кэша
+    text = ' '.join(f'Известно, что у {t} есть ответ.' for t in tokens)
+    inflected[size] = measure(lambda: inflector.reconstruct(comp, text), repeat=20 if quick else 200)
+  return {'sizes': results, 'inflected': inflected}
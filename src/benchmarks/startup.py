@@ -0,0 +1,71 @@
+import re
+import sys
+import time
+import statistics
+import subprocess
+from pathlib import Path
+
+
+SRC = Path(__file__).resolve().parents[1]
+
+MODULES = ['ngui', 'llm', 'masking', 'tools']
+
+# Что не должно загружаться при старте, пока не понадобится
+HEAVY = [
+  'langchain_deepseek',
+  'langchain_gigachat',
+  'langchain_openai',
+  'langchain_community',
+  'presidio_analyzer',
+  'spacy',
+  'pymorphy3',
+]
+
+LINE_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def import_profile(module: str) -> dict:
+  ''' Холодный импорт модуля в отдельном процессе с -X importtime. '''
+  start = time.perf_counter()
+  proc = subprocess.run(
+    [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+    cwd=SRC,
+    capture_output=True,
+    text=True,
+  )
+  wall = time.perf_counter() - start
+  if proc.returncode:
+    raise RuntimeError(f'import {module} failed:\n{proc.stderr[-2000:]}')
+
+  total = 0
+  packages: dict[str, int] = {}
+  for line in proc.stderr.splitlines():
+    if m := LINE_RE.match(line):
+      package = m.group(4).split('.')[0]
+      # Собственное время модулей, сложенное по пакетам верхнего уровня
+      packages[package] = packages.get(package, 0) + int(m.group(1))
+      # Отступ в один пробел – модуль импортирован напрямую, без вложенности
+      if len(m.group(3)) == 1:
+        total += int(m.group(2))
+  return {
+    'wall_seconds': wall,
+    'import_seconds': total / 1e6,
+    'slowest_packages': {
+      name: us / 1e6 for name, us in sorted(packages.items(), key=lambda x: -x[1])[:10]
+    },
+    'heavy_loaded': [h for h in HEAVY if h in packages],
+  }
+
+
+def run(quick: bool = False) -> dict:
+  repeat = 1 if quick else 5
+  results = {}
+  for module in MODULES:
+    profiles = [import_profile(module) for _ in range(repeat)]
+    # Детали берём из самого быстрого запуска: он меньше всего зашумлён
+    best = min(profiles, key=lambda p: p['wall_seconds'])
+    results[module] = {
+      **best,
+      'wall_seconds_median': statistics.median(p['wall_seconds'] for p in profiles),
+    }
+  return results
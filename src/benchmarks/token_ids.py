@@ -0,0 +1,65 @@
+import re
+import time
+import uuid
+
+from langchain_core.messages import HumanMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+from compendium import Compendium, Substitution, PIIKind, TOKEN_RE
+from masking import Masker
+from memory import token_counter
+
+from benchmarks.corpus import sentences
+
+
+def uuid_token(kind: PIIKind) -> str:
+  ''' Прежняя схема: обрезанный uuid4 без проверки на повтор. '''
+  return f'⟪PII:{kind}:{str(uuid.uuid4())[:8]}⟫'
+
+
+def generation(n: int) -> dict:
+  # В обоих случаях токен сразу заносится в компендиум, как при маскировании
+  comp = Compendium()
+  start = time.perf_counter()
+  for _ in range(n):
+    comp.add(Substitution(text='', lemma='', kind=PIIKind.PERSON, token=comp.make_token(PIIKind.PERSON)))
+  allocator = time.perf_counter() - start
+
+  old = Compendium()
+  start = time.perf_counter()
+  for _ in range(n):
+    old.add(Substitution(text='', lemma='', kind=PIIKind.PERSON, token=uuid_token(PIIKind.PERSON)))
+  uuid_seconds = time.perf_counter() - start
+  return {
+    'tokens': n,
+    'allocator_ns_per_token': allocator / n * 1e9,
+    'uuid_ns_per_token': uuid_seconds / n * 1e9,
+    'id_length': comp.id_length,
+    # Повтор id молча затирает прежнюю подстановку
+    'uuid_collisions': n - len(old.dictionary),
+  }
+
+
+def prompt_tokens(texts: list[str]) -> dict:
+  masked = Masker(Compendium()).mask_batch(texts)
+  # Те же тексты с id прежнего вида
+  old = [TOKEN_RE.sub(lambda m: uuid_token(re.match(r'⟪PII:(\w+):', m.group(0)).group(1)), t) for t in masked]
+  count = token_counter()
+  new_tokens = count([HumanMessage(t) for t in masked])
+  old_tokens = count([HumanMessage(t) for t in old])
+  return {
+    'texts': len(texts),
+    # Без словаря tiktoken оценка приблизительная и разницу в id почти не видит
+    'approximate': count is count_tokens_approximately,
+    'pii_tokens': sum(len(TOKEN_RE.findall(t)) for t in masked),
+    'prompt_tokens': new_tokens,
+    'prompt_tokens_uuid': old_tokens,
+    'saved': 1 - new_tokens / old_tokens,
+  }
+
+
+def run(quick: bool = False) -> dict:
+  return {
+    'generation': generation(10_000 if quick else 1_000_000),
+    'prompt': prompt_tokens(sentences(50 if quick else 500)),
+  }
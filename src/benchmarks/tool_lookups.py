@@ -0,0 +1,49 @@
+import asyncio
+
+import tools
+from compendium import Substitution, PIIKind
+
+from benchmarks.harness import ameasure
+
+
+def person_token(lemma: str) -> str:
+  token = tools.comp.make_token(PIIKind.PERSON)
+  tools.comp.add(Substitution(text=lemma.title(), lemma=lemma, kind=PIIKind.PERSON, token=token))
+  return token
+
+
+def number_token(value: int) -> str:
+  token = tools.comp.make_token(PIIKind.NUMBER)
+  tools.comp.add(Substitution(text=str(value), lemma=str(value), kind=PIIKind.NUMBER, token=token))
+  return token
+
+
+async def arun(quick: bool = False) -> dict:
+  repeat = 50 if quick else 1000
+  people = [person_token(lemma) for lemma in tools.db['age']]
+  numbers = [number_token(n) for n in range(100)]
+  group = (people * 10)[:10]
+
+  async def age_each():
+    for t in group:
+      await tools.age.ainvoke({'t': t})
+
+  results = {
+    'age': await ameasure(lambda: tools.age.ainvoke({'t': people[0]}), repeat),
+    # Десять возрастов по одному и одним пакетным вызовом
+    'age_x10': await ameasure(age_each, repeat),
+    'ages_10': await ameasure(lambda: tools.ages.ainvoke({'tl': group}), repeat),
+    'compare': await ameasure(
+      lambda: tools.compare.ainvoke({'t1': numbers[0], 't2': numbers[1]}), repeat
+    ),
+    'sort_100': await ameasure(lambda: tools.sort.ainvoke({'tl': numbers}), repeat),
+    'rank_top5_of_100': await ameasure(
+      lambda: tools.rank.ainvoke({'tl': numbers, 'k': 5}), repeat
+    ),
+  }
+  tools.comp.clear()
+  return results
+
+
+def run(quick: bool = False) -> dict:
+  return asyncio.run(arun(quick))
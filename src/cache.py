@@ -0,0 +1,174 @@
+import re
+import json
+import time
+import uuid
+import hashlib
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+  AIMessage,
+  BaseMessage,
+  ToolMessage,
+)
+
+from compendium import Compendium, TOKEN_RE
+
+
+PLACEHOLDER_RE = re.compile(r'⟪PII:(\w+):#(\d+)⟫')
+
+
+class TTLCache:
+  ''' LRU-кэш с ограничением по числу записей и времени жизни. '''
+  def __init__(self, maxsize: int = 1024, ttl: float = 600.0, clock: Callable[[], float] = time.monotonic):
+    self.maxsize = maxsize
+    self.ttl = ttl
+    self.clock = clock
+    self.entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+
+  def __len__(self) -> int:
+    return len(self.entries)
+
+
+  def get(self, key: Hashable, default: Any = None, valid: Callable[[Any], bool] | None = None) -> Any:
+    ''' valid – дополнительная проверка записи; не прошедшая её запись удаляется. '''
+    entry = self.entries.get(key)
+    if entry is None or entry[0] < self.clock() or (valid and not valid(entry[1])):
+      if entry is not None:
+        del self.entries[key]
+      self.misses += 1
+      return default
+    self.entries.move_to_end(key)
+    self.hits += 1
+    return entry[1]
+
+
+  def put(self, key: Hashable, value: Any, ttl: float | None = None):
+    self.entries[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+    self.entries.move_to_end(key)
+    while len(self.entries) > self.maxsize:
+      self.entries.popitem(last=False)
+
+
+  def invalidate(self, key: Hashable):
+    self.entries.pop(key, None)
+
+
+  def clear(self):
+    self.entries.clear()
+    self.hits = self.misses = 0
+
+
+def model_id(llm: BaseChatModel) -> str:
+  # bind_tools возвращает RunnableBinding, сама модель – в bound
+  model = getattr(llm, 'bound', llm)
+  name = getattr(model, 'model_name', None) or getattr(model, 'model', None) or ''
+  return f'{model._llm_type}:{name}'
+
+
+def canonicalize(messages: Sequence[BaseMessage]) -> tuple[str, list[str]]:
+  ''' Заменяет токены ⟪PII:KIND:id⟫ на ⟪PII:KIND:#n⟫, где n – номер первого появления токена.
+  Возвращает каноническую запись промпта и токены в порядке номеров.
+  Идентификаторы вызовов инструментов в запись не входят.
+  '''
+  positions: dict[str, int] = {}
+
+  def sub(m: re.Match) -> str:
+    token = m.group(0)
+    n = positions.setdefault(token, len(positions))
+    return f'⟪PII:{token[len("⟪PII:"):token.rindex(":")]}:#{n}⟫'
+
+  items = []
+  for m in messages:
+    item = [m.type, TOKEN_RE.sub(sub, m.text())]
+    if isinstance(m, AIMessage) and m.tool_calls:
+      item.append([
+        [c['name'], TOKEN_RE.sub(sub, json.dumps(c['args'], ensure_ascii=False, sort_keys=True))]
+        for c in m.tool_calls
+      ])
+    elif isinstance(m, ToolMessage):
+      item.append(m.name)
+    items.append(item)
+  return json.dumps(items, ensure_ascii=False), list(positions)
+
+
+class ResponseCache:
+  ''' Кэш ответов модели по замаскированному промпту.
+  После маскирования запросы разных пользователей совпадают с точностью до идентификаторов
+  токенов, поэтому ключ строится по канонической записи промпта (см. canonicalize), модели
+  и набору инструментов. Ответ хранится с позиционными плейсхолдерами и при попадании
+  собирается заново из токенов текущего промпта. Ответы с токенами, которых нет в промпте,
+  не кэшируются: их не к чему привязать.
+  '''
+  def __init__(self, maxsize: int = 1024, ttl: float = 600.0):
+    self.entries = TTLCache(maxsize, ttl)
+
+
+  def key(self, model: str, tools: Sequence[str], messages: Sequence[BaseMessage]) -> tuple[str, list[str]]:
+    canonical, tokens = canonicalize(messages)
+    digest = hashlib.sha256(
+      json.dumps([model, sorted(tools), canonical], ensure_ascii=False).encode()
+    ).hexdigest()
+    return digest, tokens
+
+
+  def get(self, key: tuple[str, list[str]], comp: Compendium | None = None) -> AIMessage | None:
+    digest, tokens = key
+    entry = self.entries.get(digest, valid=lambda _: comp is None or all(comp.get(t) for t in tokens))
+    if entry is None:
+      return None
+    content, calls = entry
+
+    def sub(m: re.Match) -> str:
+      return tokens[int(m.group(2))]
+
+    return AIMessage(
+      content=PLACEHOLDER_RE.sub(sub, content),
+      tool_calls=[
+        {
+          'name': name,
+          'args': json.loads(PLACEHOLDER_RE.sub(sub, args)),
+          'id': f'call_{uuid.uuid4().hex[:12]}',
+          'type': 'tool_call',
+        }
+        for name, args in calls
+      ],
+    )
+
+
+  def put(self, key: tuple[str, list[str]], response: AIMessage) -> bool:
+    digest, tokens = key
+    positions = {t: i for i, t in enumerate(tokens)}
+
+    def sub(m: re.Match) -> str:
+      token = m.group(0)
+      return f'⟪PII:{token[len("⟪PII:"):token.rindex(":")]}:#{positions[token]}⟫'
+
+    try:
+      content = TOKEN_RE.sub(sub, response.text())
+      calls = [
+        (c['name'], TOKEN_RE.sub(sub, json.dumps(c['args'], ensure_ascii=False)))
+        for c in response.tool_calls
+      ]
+    except KeyError:
+      return False
+    self.entries.put(digest, (content, calls))
+    return True
+
+
+  @property
+  def hits(self) -> int:
+    return self.entries.hits
+
+
+  @property
+  def misses(self) -> int:
+    return self.entries.misses
+
+
+  def clear(self):
+    self.entries.clear()
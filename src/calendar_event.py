@@ -1,24 +1,33 @@
 from hashlib import md5
 from datetime import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class CalendarEvent:
   uid: str
   dtstart: datetime
   dtend: datetime
-  last_modified: datetime
+  last_modified: datetime | None
   summary: str | None = None
   description: str | None = None
   location: str | None = None
   parent_uid: str | None = None
   recurrence_id: str | None = None
   rrule: str | None = None
+  # Отменённое вхождение серии: убирает его из развёртки
+  cancelled: bool = False
+  content_hash: str | None = field(default=None, init=False, repr=False, compare=False)
+
 
   @property
   def hash(self) -> str:
-    raw = f"{self.summary}|{self.dtstart.isoformat()}|{self.dtend.isoformat()}|{self.description}|{self.location}|{self.rrule}"
-    return md5(raw.encode('utf-8')).hexdigest()
+    # Считаем при первом обращении и храним в событии: при разборе
+    # большого календаря хэш большинству событий не понадобится.
+    # Событие неизменяемо, изменённая копия (replace) считает хэш заново
+    if self.content_hash is None:
+      raw = f"{self.summary}|{self.dtstart.isoformat()}|{self.dtend.isoformat()}|{self.description}|{self.location}|{self.rrule}|{self.cancelled}"
+      object.__setattr__(self, 'content_hash', md5(raw.encode('utf-8')).hexdigest())
+    return self.content_hash
 
 
   @property
@@ -31,7 +40,7 @@ class CalendarEvent:
     if not self.rrule.startswith("RRULE:"):
       return "RRULE:" + self.rrule
     return self.rrule
-  
+
 
   def __str__(self) -> str:
-    return f"{self.uid}:{self.summary}"
\ No newline at end of file
+    return f"{self.uid}:{self.summary}"
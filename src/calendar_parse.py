@@ -0,0 +1,52 @@
+import sys
+from datetime import datetime, timezone
+from typing import Iterable
+
+from calendar_event import CalendarEvent
+
+
+def when(value: dict) -> str | None:
+  return value.get('dateTime') or value.get('date')
+
+
+def is_cancelled(item: dict) -> bool:
+  return item.get('status') == 'cancelled' and 'originalStartTime' in item
+
+
+def parse_events(items: Iterable[dict], intern: bool = True) -> dict[str, CalendarEvent]:
+  ''' Разбирает события Google Calendar API в CalendarEvent.
+  Разбор идёт по столбцам: сначала собираются строки с датами,
+  каждая уникальная строка разбирается один раз, затем строятся события.
+  Повторяющиеся summary и location при intern=True хранятся в одном экземпляре.
+  Отменённые вхождения серий приходят без start и end: их время – originalStartTime.
+  '''
+  items = [e for e in items if 'start' in e and 'end' in e or is_cancelled(e)]
+
+  starts = [when(e.get('start') or e['originalStartTime']) for e in items]
+  ends = [when(e.get('end') or e['originalStartTime']) for e in items]
+  updated = [e.get('updated') for e in items]
+
+  fromisoformat, utc = datetime.fromisoformat, timezone.utc
+  parsed = {s: fromisoformat(s).astimezone(utc) for s in set(starts + ends + updated) if s}
+  text = sys.intern if intern else str
+
+  events = {}
+  for e, start, end, modified in zip(items, starts, ends, updated):
+    uid = e['id']
+    recurrence = e.get('recurrence')
+    original = e.get('originalStartTime')
+    events[uid] = CalendarEvent(
+      uid=uid,
+      dtstart=parsed[start],
+      dtend=parsed[end],
+      # Без updated время изменения неизвестно
+      last_modified=parsed.get(modified),
+      summary=text(e.get('summary') or ''),
+      description=e.get('description', ''),
+      location=text(e.get('location') or ''),
+      parent_uid=e.get('recurringEventId'),
+      recurrence_id=original and when(original),
+      rrule=recurrence[0].removeprefix('RRULE:') if recurrence else '',
+      cancelled=e.get('status') == 'cancelled',
+    )
+  return events
@@ -0,0 +1,76 @@
+from typing import Iterable, Protocol
+from dataclasses import dataclass, field
+
+from calendar_event import CalendarEvent
+
+
+class CalendarTarget(Protocol):
+  def create_event(self, event: CalendarEvent) -> str:
+    pass
+
+  def update_event(self, event_id: str, event: CalendarEvent) -> None:
+    pass
+
+  def delete_event(self, event_id: str) -> None:
+    pass
+
+
+@dataclass
+class SyncPlan:
+  create: list[CalendarEvent] = field(default_factory=list)
+  update: list[CalendarEvent] = field(default_factory=list)
+  delete: list[str] = field(default_factory=list)
+
+
+  def __bool__(self) -> bool:
+    return bool(self.create or self.update or self.delete)
+
+
+  def __len__(self) -> int:
+    return len(self.create) + len(self.update) + len(self.delete)
+
+
+  def __str__(self) -> str:
+    return f'create: {len(self.create)}, update: {len(self.update)}, delete: {len(self.delete)}'
+
+
+def _by_uid(events: dict[str, CalendarEvent] | Iterable[CalendarEvent]) -> dict[str, CalendarEvent]:
+  if isinstance(events, dict):
+    return events
+  return {e.uid: e for e in events}
+
+
+def diff_events(
+  local: dict[str, CalendarEvent] | Iterable[CalendarEvent],
+  remote: dict[str, CalendarEvent] | Iterable[CalendarEvent],
+) -> SyncPlan:
+  ''' Строит минимальный план изменений, после которого remote совпадёт с local.
+  События сопоставляются по uid, изменения определяются по хэшу содержимого.
+  '''
+  local = _by_uid(local)
+  remote = _by_uid(remote)
+
+  plan = SyncPlan()
+  for uid, event in local.items():
+    if (other := remote.get(uid)) is None:
+      plan.create.append(event)
+    elif other.hash != event.hash:
+      plan.update.append(event)
+
+  plan.delete = [uid for uid in remote if uid not in local]
+  return plan
+
+
+def apply_plan(target: CalendarTarget, plan: SyncPlan, remote_ids: dict[str, str]) -> dict[str, str]:
+  ''' Применяет план к календарю. remote_ids – соответствие локальных uid
+  идентификаторам событий в календаре: по нему обновляются и удаляются события.
+  Возвращает новое соответствие: с созданными событиями и без удалённых.
+  '''
+  ids = dict(remote_ids)
+  for event in plan.create:
+    ids[event.uid] = target.create_event(event)
+  for event in plan.update:
+    target.update_event(ids[event.uid], event)
+  for uid in plan.delete:
+    target.delete_event(ids.pop(uid))
+  return ids
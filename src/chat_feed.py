@@ -0,0 +1,126 @@
+from datetime import datetime
+from dataclasses import dataclass
+
+from nicegui import ui
+
+from config import (
+  AGENT_AVATAR,
+  CHAT_PAGE,
+  CHAT_WINDOW,
+  USER_AVATAR
+)
+
+
+@dataclass(slots=True)
+class Turn:
+  question: str
+  asked: str
+  answer: str | None = None
+  answered: str | None = None
+
+
+def render_question(turn: Turn):
+  ui.chat_message(
+    text=turn.question,
+    name='User',
+    stamp=turn.asked,
+    sent=True,
+    avatar=USER_AVATAR
+  )
+
+
+def render_answer(turn: Turn):
+  ui.chat_message(
+    text=turn.answer,
+    name='Agent',
+    stamp=turn.answered,
+    sent=False,
+    avatar=AGENT_AVATAR
+  )
+
+
+class ChatFeed:
+  ''' Лента чата, в которой живыми элементами остаются только последние window ходов.
+  Более старые ходы удаляются со страницы и хранятся как Turn: вопрос, ответ и время,
+  без шагов агента. Кнопка вверху ленты возвращает их на страницу по page ходов.
+  '''
+  def __init__(self, container: ui.element, window: int = CHAT_WINDOW, page: int = CHAT_PAGE):
+    self.container = container
+    self.window = window
+    self.page = page
+    self.archive: list[Turn] = []
+    self.live: list[tuple[ui.element, Turn]] = []
+    with container:
+      self.more = ui.button('Показать предыдущие', on_click=self.load_earlier) \
+        .props('flat dense no-caps') \
+        .classes('self-center')
+    self.more.set_visibility(False)
+
+
+  def ask(self, question: str) -> tuple[ui.element, tuple[ui.element, Turn]]:
+    ''' Добавляет ход с вопросом. Возвращает сообщение агента для шагов и спиннера
+    и ход, который передаётся в answer: пока агент отвечает, могут начаться новые ходы.
+    '''
+    turn = Turn(question=question, asked=datetime.now().strftime('%H:%M'))
+    with self.container:
+      with ui.column().classes('w-full') as column:
+        render_question(turn)
+        agent_message = ui.chat_message(
+          name='Agent',
+          sent=False,
+          avatar=AGENT_AVATAR
+        ).props('bg-color=blue-2')
+    self.live.append((column, turn))
+    return agent_message, (column, turn)
+
+
+  def answer(self, handle: tuple[ui.element, Turn], text: str):
+    column, turn = handle
+    turn.answer = text
+    turn.answered = datetime.now().strftime('%H:%M')
+    with column:
+      render_answer(turn)
+    self.trim()
+
+
+  def restore(self, turns: list[tuple[str, str | None]]):
+    ''' Показывает ходы продолженного разговора: вопросы и ответы без шагов и времени.
+    На страницу выводятся последние window ходов, остальные сразу уходят в архив.
+    '''
+    turns = [Turn(question=q, asked='', answer=a, answered='') for q, a in turns]
+    cut = max(0, len(turns) - self.window)
+    self.archive += turns[:cut]
+    with self.container:
+      for turn in turns[cut:]:
+        with ui.column().classes('w-full') as column:
+          render_question(turn)
+          if turn.answer is not None:
+            render_answer(turn)
+        self.live.append((column, turn))
+    self.more.set_visibility(bool(self.archive))
+
+
+  def trim(self):
+    # Ход без ответа в архив не уходит: в его сообщение ещё пишут шаги и спиннер.
+    # Он и следующие за ним уберутся, когда он получит ответ
+    while len(self.live) > self.window and self.live[0][1].answer is not None:
+      column, turn = self.live.pop(0)
+      column.delete()
+      self.archive.append(turn)
+    self.more.set_visibility(bool(self.archive))
+
+
+  def load_earlier(self):
+    restored, self.archive = self.archive[-self.page:], self.archive[:-self.page]
+    columns = []
+    with self.container:
+      for i, turn in enumerate(restored):
+        with ui.column().classes('w-full') as column:
+          render_question(turn)
+          if turn.answer is not None:
+            render_answer(turn)
+        # Сразу после кнопки, в хронологическом порядке
+        column.move(self.container, target_index=1 + i)
+        columns.append((column, turn))
+    self.live = columns + self.live
+    self.more.set_visibility(bool(self.archive))
@@ -1,7 +1,18 @@
+import re
 import pprint
+import random
+import string
+import threading
 from enum import StrEnum
+from typing import Protocol
 from dataclasses import dataclass, asdict
 
+from config import TOKEN_ID_LENGTH
+
+
+TOKEN_RE = re.compile(r'⟪PII:\w+:\w+⟫')
+TOKEN_ID_ALPHABET = string.digits + string.ascii_lowercase
+
 
 class PIIKind(StrEnum):
   PERSON = 'PERSON'
@@ -9,6 +20,9 @@ class PIIKind(StrEnum):
   NUMBER = 'NUMBER'
   RELATIONSHIP = 'RELATIONSHIP'
   LOCATION = 'LOCATION'
+  PHONE = 'PHONE'
+  PASSPORT = 'PASSPORT'
+  IBAN = 'IBAN'
 
 
 @dataclass
@@ -19,13 +33,67 @@ class Substitution:
   token: str
 
 
+def parse_number(text: str) -> int | float | None:
+  try:
+    value = float(text.replace(' ', '').replace(',', '.'))
+  except ValueError:
+    return None
+  return int(value) if value.is_integer() else value
+
+
+class Journal(Protocol):
+  def append(self, substitution: Substitution):
+    pass
+
+  def reset(self):
+    pass
+
+
 class Compendium:
-  def __init__(self):
+  def __init__(self, id_length: int = TOKEN_ID_LENGTH):
     self.dictionary: dict[str, Substitution] = {}
+    # Генератор id засевается один раз, дальше токены выдаются без обращений к ОС
+    self.rnd = random.Random()
+    self.id_length = id_length
+    # Значения токенов NUMBER, разобранные один раз при добавлении
+    self.numbers: dict[str, int | float] = {}
+    # Куда записываются новые подстановки, см. persistence
+    self.journal: Journal | None = None
+    # Выданные make_token, но ещё не добавленные токены: маскирование одной сессии
+    # может идти в нескольких потоках (MCP), и id не должен достаться двоим
+    self.reserved: set[str] = set()
+    # Токены, удалённые clear: замаскированный текст с ними мог остаться в кэшах
+    # и истории разговора, поэтому их id больше не выдаются
+    self.retired: set[str] = set()
+    self.lock = threading.Lock()
 
 
   def add(self, substitution: Substitution):
-    self.dictionary[substitution.token] = substitution
+    with self.lock:
+      new = substitution.token not in self.dictionary
+      self.dictionary[substitution.token] = substitution
+      self.reserved.discard(substitution.token)
+    if new and self.journal is not None:
+      self.journal.append(substitution)
+    if substitution.kind == PIIKind.NUMBER:
+      if (value := parse_number(substitution.lemma)) is not None:
+        self.numbers[substitution.token] = value
+
+
+  def make_token(self, kind: PIIKind) -> str:
+    ''' Новый токен ⟪PII:KIND:id⟫, которого ещё нет в компендиуме.
+    id случайные, а не порядковые: соседние номера модель путает легче. Когда занято
+    больше 1/16 всех id текущей длины, длина увеличивается, и повторы остаются редкими.
+    '''
+    with self.lock:
+      taken = len(self.dictionary) + len(self.reserved) + len(self.retired)
+      while len(TOKEN_ID_ALPHABET) ** self.id_length < 16 * (taken + 1):
+        self.id_length += 1
+      while True:
+        token = f'⟪PII:{kind}:{"".join(self.rnd.choices(TOKEN_ID_ALPHABET, k=self.id_length))}⟫'
+        if token not in self.dictionary and token not in self.reserved and token not in self.retired:
+          self.reserved.add(token)
+          return token
 
 
   def __repr__(self) -> str:
@@ -33,17 +101,34 @@ class Compendium:
   
 
   def reconstruct(self, text: str) -> str:
-    for token, substitution in self.dictionary.items():
-      text = text.replace(token, substitution.text)
-    return text
+    # Один проход по токенам текста, а не по всему компендиуму
+    def sub(m: re.Match) -> str:
+      s = self.dictionary.get(m.group(0))
+      return s.text if s else m.group(0)
+    return TOKEN_RE.sub(sub, text)
   
 
   def get(self, token: str) -> Substitution:
     return self.dictionary.get(token)
+
+
+  def get_many(self, tokens: list[str]) -> list[Substitution | None]:
+    get = self.dictionary.get
+    return [get(t) for t in tokens]
+
+
+  def number(self, token: str) -> int | float | None:
+    return self.numbers.get(token)
   
 
   def clear(self):
-    self.dictionary = {}
+    # Выданные, но ещё не добавленные токены остаются в reserved: их добавят в новый словарь
+    with self.lock:
+      self.retired.update(self.dictionary)
+      self.dictionary = {}
+      self.numbers = {}
+    if self.journal is not None:
+      self.journal.reset()
   
     
   def as_dict(self) -> dict:
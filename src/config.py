@@ -10,21 +10,115 @@ SYSTEM_PROMPT = (
 
 
 LLM_MODEL = 'gigachat'
+# Для LLM_MODEL = 'router': провайдеры в порядке опроса, таймаут запроса и хеджирование
+LLM_ROUTE = ['gigachat', 'deepseek']
+LLM_TIMEOUT = 30.0
+LLM_HEDGE = False
 USER_AVATAR = 'https://robohash.org/panso?set=set4'
 AGENT_AVATAR = 'https://robohash.org/quixote'
+# log, ring, prometheus
+METRICS_SINKS = ['ring', 'prometheus']
+# memory или sqlite
+CHECKPOINTER = 'memory'
+CHECKPOINT_DB = 'checkpoints.sqlite'
+# Бюджет промпта в токенах и порог, после которого старые ходы пересказываются
+PROMPT_MAX_TOKENS = 3000
+HISTORY_SUMMARIZE_AFTER = 40
+HISTORY_KEEP_MESSAGES = 12
+# Словарь tiktoken для подсчёта токенов; None – приблизительная оценка
+PROMPT_TOKENIZER = 'cl100k_base'
+# Предел длины результата инструмента и результатов прошлых раундов вызовов
+TOOL_RESULT_MAX_CHARS = 4000
+TOOL_RESULT_OLD_CHARS = 300
+# Кэш ответов модели по замаскированному промпту; размер 0 отключает кэш
+LLM_CACHE_SIZE = 1024
+LLM_CACHE_TTL = 600
+# Шаги хода выводятся пачками раз в кадр; открытыми остаются последние,
+# длинные результаты обрезаются
+UI_STEP_FRAME = 0.05
+UI_STEP_KEEP_OPEN = 2
+UI_STEP_MAX_CHARS = 2000
+# Ходов чата на странице; более старые убираются в архив и подгружаются по page
+CHAT_WINDOW = 20
+CHAT_PAGE = 10
+# HTTP API: одновременных запросов, мест в очереди (сверх них – 429)
+# и компендиумов сессий в памяти
+API_HOST = '127.0.0.1'
+API_PORT = 8081
+API_CONCURRENCY = 8
+API_QUEUE = 32
+API_SESSIONS = 10_000
+API_SESSION_TTL = 3600
+# MCP-сервер масок и инструментов
+MCP_HOST = '127.0.0.1'
+MCP_PORT = 8082
+MCP_SESSIONS = 10_000
+MCP_SESSION_TTL = 3600
+# Компендиумы сессий на диске (шифруются ключом COMPENDIUM_KEY, без ключа не сохраняются):
+# журнал сжимается в снимок каждые COMPENDIUM_SNAPSHOT_EVERY записей
+COMPENDIUM_DIR = 'compendium'
+COMPENDIUM_SNAPSHOT_EVERY = 256
+COMPENDIUM_FSYNC = False
+# Начальная длина id в токенах ⟪PII:KIND:id⟫; растёт вместе с компендиумом
+TOKEN_ID_LENGTH = 4
+# Сущности Presidio, которые маскируются, если вызов не запросил другие
+PII_ENTITIES = ['PERSON', 'LOCATION', 'EMAIL_ADDRESS', 'PHONE_NUMBER', 'RU_PASSPORT', 'IBAN_CODE']
+# Результаты с меньшей уверенностью отбрасываются: шаблонам без слов контекста её не хватает
+PII_SCORE_THRESHOLD = 0.4
+# Встроенные распознаватели Presidio, которые не регистрируются: PhoneRecognizer
+# ищет номера США и Европы и принимает за телефоны любые десять цифр
+PII_DISABLED_RECOGNIZERS = ['PhoneRecognizer']
+# Распознаватели по шаблонам сверх встроенных в Presidio (формат PatternRecognizer.from_dict);
+# kind – вид токена ⟪PII:KIND:*⟫ для их сущности
+PII_RECOGNIZERS = [
+  {
+    'kind': 'PHONE',
+    'name': 'RuPhoneRecognizer',
+    'supported_entity': 'PHONE_NUMBER',
+    'patterns': [{
+      'name': 'ru_phone',
+      'regex': r'(?<!\w)(?:\+7|8)[\s(-]*\d{3}[\s)-]*\d{3}[\s-]*\d{2}[\s-]*\d{2}(?!\w)',
+      'score': 0.6,
+    }],
+    'context': ['телефон', 'тел', 'звон', 'номер'],
+  },
+  {
+    'kind': 'PASSPORT',
+    'name': 'RuPassportRecognizer',
+    'supported_entity': 'RU_PASSPORT',
+    'patterns': [{'name': 'ru_passport', 'regex': r'(?<!\d)\d{2}\s?\d{2}\s?\d{6}(?!\d)', 'score': 0.3}],
+    'context': ['паспорт', 'серия'],
+  },
+]
+# Календарь Google, который читает show_schedule (нужен google_credentials_file)
+CALENDAR_ID = 'primary'
+# Окон развёртки повторяющихся событий в кэше
+RECURRENCE_CACHE_SIZE = 1024
+# Снятые с маски имена и названия ставятся в падеж по контексту ответа
+UNMASK_INFLECT = True
+INFLECT_CACHE_SIZE = 4096
 
 
 class Settings(BaseSettings):
-  deepseek_model: str
-  deepseek_api_key: str
-  gigachat_model: str
-  gigachat_api_key: str
-  yandexgpt_model: str
-  yandexgpt_api_key: str
-  openrouter_model: str
-  openrouter_api_key: str
-  google_credentials_file: str
-  google_token_file: str
+  # Ключи нужны только выбранному провайдеру: с LLM_MODEL = 'fake'
+  # приложение запускается без .env
+  deepseek_model: str = ''
+  deepseek_api_key: str = ''
+  gigachat_model: str = ''
+  gigachat_api_key: str = ''
+  yandexgpt_model: str = ''
+  yandexgpt_api_key: str = ''
+  openrouter_model: str = ''
+  openrouter_api_key: str = ''
+  google_credentials_file: str = ''
+  google_token_file: str = ''
+  fake_latency: str = 'lognormal'
+  fake_latency_mean: float = 0.8
+  fake_latency_spread: float = 0.4
+  fake_chunk_delay: float = 0.02
+  fake_seed: int | None = None
+  # Ключи Fernet через запятую: первым шифруется, остальными только читается
+  compendium_key: str = ''
 
 
   model_config = ConfigDict(
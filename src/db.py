@@ -1,16 +1,84 @@
 
+class Table(dict):
+  ''' Таблица с номером версии, который растёт при каждом изменении:
+  по нему кэши результатов инструментов узнают, что данные устарели.
+  '''
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.version = 0
+
+
+  def __setitem__(self, key, value):
+    super().__setitem__(key, value)
+    self.version += 1
+
+
+  def __delitem__(self, key):
+    super().__delitem__(key)
+    self.version += 1
+
+
+  def update(self, *args, **kwargs):
+    super().update(*args, **kwargs)
+    self.version += 1
+
+
+  def __ior__(self, other):
+    super().__ior__(other)
+    self.version += 1
+    return self
+
+
+  def setdefault(self, key, default=None):
+    if key in self:
+      return self[key]
+    self[key] = default
+    return default
+
+
+  def pop(self, key, *default):
+    # Версия растёт только после удаления: ни отсутствующий ключ, ни KeyError её не меняют
+    if key not in self:
+      return super().pop(key, *default)
+    value = super().pop(key)
+    self.version += 1
+    return value
+
+
+  def popitem(self):
+    item = super().popitem()
+    self.version += 1
+    return item
+
+
+  def clear(self):
+    super().clear()
+    self.version += 1
+
+
 db = {
-  'age': {
+  'age': Table({
     'иван сергеевич': 42,
     'демьян исаакович': 33
-  },
-  'cities': {
+  }),
+  'cities': Table({
     'москва': 2562,
     'тюмень': 698,
     'тверь': 152,
-  },
+  }),
 }
 
+
+def lookup(table: str, keys: list[str | None]) -> list:
+  ''' Значения из таблицы table для списка ключей за один проход; None для отсутствующих. '''
+  rows = db[table]
+  return [rows.get(k) if k is not None else None for k in keys]
+
+
+def versions(tables: tuple[str, ...]) -> tuple[int, ...]:
+  return tuple(db[t].version for t in tables)
+
+
 db_tree = [
   {
     'id':'age', 
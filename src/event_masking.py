@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Iterable
+
+from calendar_event import CalendarEvent
+from compendium import Substitution, TOKEN_RE
+from masking import Masker
+
+
+FIELDS = ('summary', 'description', 'location')
+
+
+@dataclass
+class MaskedFields:
+  values: dict[str, str | None]
+  substitutions: list[Substitution]
+
+
+class EventMasker:
+  ''' Маскирует текстовые поля событий календаря перед передачей в LLM.
+  Результат кэшируется по хэшу содержимого события, поэтому неизменившиеся
+  события повторно через анализатор не проходят. Запись кэша годится, пока её
+  токены в компендиуме означают то же, что при маскировании.
+  '''
+
+  def __init__(self, masker: Masker, maxsize: int = 10_000):
+    self.masker = masker
+    self.maxsize = maxsize
+    self._cache: OrderedDict[str, MaskedFields] = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+
+  def mask_events(self, events: Iterable[CalendarEvent]) -> list[CalendarEvent]:
+    events = list(events)
+    found: dict[str, MaskedFields] = {}
+    pending: dict[str, CalendarEvent] = {}
+    for event in events:
+      if event.hash in found or event.hash in pending:
+        continue
+      if (fields := self._cache.get(event.hash)) is not None and self._restore(fields):
+        self.hits += 1
+        self._cache.move_to_end(event.hash)
+        found[event.hash] = fields
+      else:
+        self.misses += 1
+        self._cache.pop(event.hash, None)
+        pending[event.hash] = event
+
+    if pending:
+      found.update(self._mask_pending(list(pending.values())))
+
+    return [replace(event, **found[event.hash].values) for event in events]
+
+
+  def mask_event(self, event: CalendarEvent) -> CalendarEvent:
+    return self.mask_events([event])[0]
+
+
+  def clear(self):
+    self._cache.clear()
+
+
+  def _mask_pending(self, events: list[CalendarEvent]) -> dict[str, MaskedFields]:
+    slots = []
+    texts = []
+    for i, event in enumerate(events):
+      for name in FIELDS:
+        if value := getattr(event, name):
+          slots.append((i, name))
+          texts.append(value)
+
+    masked = dict(zip(slots, self.masker.mask_batch(texts)))
+
+    result = {}
+    for i, event in enumerate(events):
+      values = {name: masked.get((i, name), getattr(event, name)) for name in FIELDS}
+      result[event.hash] = self._cache[event.hash] = MaskedFields(
+        values=values,
+        # Похожий на токен текст, который был в событии до маскирования, в компендиуме не найдётся
+        substitutions=[
+          s for value in values.values() if value
+          for token in TOKEN_RE.findall(value)
+          if (s := self.masker.comp.get(token)) is not None
+        ],
+      )
+
+    while len(self._cache) > self.maxsize:
+      self._cache.popitem(last=False)
+    return result
+
+
+  def _restore(self, fields: MaskedFields) -> bool:
+    ''' Возвращает в компендиум подстановки закэшированного текста: компендиум могли
+    очистить. False, если токен уже означает другое – запись тогда не годится.
+    '''
+    comp = self.masker.comp
+    missing = []
+    for substitution in fields.substitutions:
+      if (current := comp.get(substitution.token)) is None:
+        missing.append(substitution)
+      elif current != substitution:
+        return False
+    for substitution in missing:
+      comp.add(substitution)
+    return True
@@ -0,0 +1,197 @@
+import re
+import json
+import math
+import time
+import random
+import asyncio
+from typing import Any, AsyncIterator, Iterator, Literal, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+  AIMessage,
+  AIMessageChunk,
+  BaseMessage,
+  HumanMessage,
+  ToolMessage,
+)
+from langchain_core.outputs import (
+  ChatGeneration,
+  ChatGenerationChunk,
+  ChatResult,
+)
+from pydantic import PrivateAttr
+
+from compendium import TOKEN_RE
+
+
+PLACEHOLDER_RE = re.compile(r'\{(\w+):(\d+)\}')
+
+# Сценарий для вопроса «Кто старше X или Y?»
+AGE_SCRIPT = [
+  {'tool_calls': [
+    {'name': 'age', 'args': {'t': '{PERSON:0}'}},
+    {'name': 'age', 'args': {'t': '{PERSON:1}'}},
+  ]},
+  {'tool_calls': [
+    {'name': 'compare', 'args': {'t1': '{NUMBER:0}', 't2': '{NUMBER:1}'}},
+  ]},
+  {'content': '{PERSON:0} и {PERSON:1}: результат сравнения возрастов получен.'},
+]
+
+
+def current_turn(messages: Sequence[BaseMessage]) -> list[BaseMessage]:
+  for i in range(len(messages) - 1, -1, -1):
+    if isinstance(messages[i], HumanMessage):
+      return list(messages[i:])
+  return list(messages)
+
+
+def turn_tokens(turn: list[BaseMessage]) -> dict[str, list[str]]:
+  tokens: dict[str, list[str]] = {}
+  for m in turn:
+    if isinstance(m, AIMessage):
+      continue
+    text = str(m.content)
+    if isinstance(m, ToolMessage):
+      # ngui сериализует результаты инструментов через json.dumps,
+      # который экранирует скобки токенов
+      try:
+        text = str(json.loads(text))
+      except ValueError:
+        pass
+    for token in TOKEN_RE.findall(text):
+      kind = token[len('⟪PII:'):token.rindex(':')]
+      if token not in tokens.setdefault(kind, []):
+        tokens[kind].append(token)
+  return tokens
+
+
+def fill(value: Any, tokens: dict[str, list[str]]) -> Any:
+  if isinstance(value, str):
+    def sub(m: re.Match) -> str:
+      found = tokens.get(m.group(1), [])
+      idx = int(m.group(2))
+      return found[idx] if idx < len(found) else m.group(0)
+    return PLACEHOLDER_RE.sub(sub, value)
+  if isinstance(value, list):
+    return [fill(v, tokens) for v in value]
+  if isinstance(value, dict):
+    return {k: fill(v, tokens) for k, v in value.items()}
+  return value
+
+
+class FakeChatModel(BaseChatModel):
+  ''' Модель без сети для нагрузочного тестирования графа.
+  Воспроизводит сценарий вызовов инструментов: номер шага определяется по числу
+  ответов модели после последнего сообщения пользователя, поэтому один экземпляр
+  можно использовать в нескольких сессиях одновременно. Плейсхолдеры вида
+  {PERSON:0} заменяются на токены из текущего хода.
+  Задержка ответа берётся из распределения latency:
+    constant  – latency_mean;
+    uniform   – равномерно в latency_mean ± latency_spread;
+    lognormal – логнормально с медианой latency_mean и sigma = latency_spread.
+  '''
+  script: list[dict] = AGE_SCRIPT
+  latency: Literal['constant', 'uniform', 'lognormal'] = 'constant'
+  latency_mean: float = 0.0
+  latency_spread: float = 0.0
+  chunk_delay: float = 0.0
+  seed: int | None = None
+  bound_tools: list[str] = []
+
+  _rnd: random.Random = PrivateAttr()
+
+
+  def model_post_init(self, context: Any):
+    self._rnd = random.Random(self.seed)
+
+
+  @property
+  def _llm_type(self) -> str:
+    return 'fake'
+
+
+  def bind_tools(self, tools: Sequence[Any], **kwargs) -> 'FakeChatModel':
+    return self.model_copy(update={
+      'bound_tools': [getattr(t, 'name', getattr(t, '__name__', str(t))) for t in tools]
+    })
+
+
+  def delay(self) -> float:
+    if self.latency == 'uniform':
+      value = self._rnd.uniform(
+        self.latency_mean - self.latency_spread,
+        self.latency_mean + self.latency_spread
+      )
+    elif self.latency == 'lognormal' and self.latency_mean > 0:
+      value = self._rnd.lognormvariate(math.log(self.latency_mean), self.latency_spread)
+    else:
+      value = self.latency_mean
+    return max(value, 0.0)
+
+
+  def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+    time.sleep(self.delay())
+    return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+
+  async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+    await asyncio.sleep(self.delay())
+    return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+
+  def _stream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+    time.sleep(self.delay())
+    for i, chunk in enumerate(self._chunks(self._respond(messages))):
+      if i and self.chunk_delay:
+        time.sleep(self.chunk_delay)
+      yield chunk
+
+
+  async def _astream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+    await asyncio.sleep(self.delay())
+    for i, chunk in enumerate(self._chunks(self._respond(messages))):
+      if i and self.chunk_delay:
+        await asyncio.sleep(self.chunk_delay)
+      yield chunk
+
+
+  def _chunks(self, message: AIMessage) -> Iterator[ChatGenerationChunk]:
+    if message.tool_calls:
+      yield ChatGenerationChunk(message=AIMessageChunk(
+        content='',
+        tool_call_chunks=[
+          {
+            'name': call['name'],
+            'args': json.dumps(call['args'], ensure_ascii=False),
+            'id': call['id'],
+            'index': i,
+          }
+          for i, call in enumerate(message.tool_calls)
+        ],
+      ))
+      return
+    for word in re.findall(r'\S+\s*', message.content):
+      yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+  def _respond(self, messages: list[BaseMessage]) -> AIMessage:
+    turn = current_turn(messages)
+    step = sum(isinstance(m, AIMessage) for m in turn)
+    entry = self.script[min(step, len(self.script) - 1)]
+    tokens = turn_tokens(turn)
+
+    if 'tool_calls' in entry:
+      return AIMessage(
+        content='',
+        tool_calls=[
+          {
+            'name': call['name'],
+            'args': fill(call['args'], tokens),
+            'id': f'call_{step}_{i}',
+            'type': 'tool_call',
+          }
+          for i, call in enumerate(entry['tool_calls'])
+        ],
+      )
+    return AIMessage(content=fill(entry['content'], tokens))
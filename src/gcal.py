@@ -1,9 +1,11 @@
+import os
 import asyncio
 import json
+import tempfile
 from pprint import pprint
 from typing import Any
 from os import path
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow # type: ignore
@@ -15,10 +17,13 @@ from aiogoogle.auth.creds import (
   ClientCreds
 )
 
+from calendar_event import CalendarEvent
+from calendar_parse import parse_events
 from config import settings 
 
 
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
+REFRESH_MARGIN = timedelta(minutes=5)
 
 
 def get_client_creds() -> ClientCreds:
@@ -31,30 +36,41 @@ def get_client_creds() -> ClientCreds:
     )
 
 
-def get_creds() -> tuple[UserCreds, ClientCreds]:
-  creds = None
+def _load_creds() -> Credentials | None:
   if path.exists(settings.google_token_file):
-    creds = Credentials.from_authorized_user_file(settings.google_token_file, SCOPES)
-  if not creds or not creds.valid:
-    if creds and creds.expired and creds.refresh_token:
-      creds.refresh(Request())
-      with open(settings.google_token_file, "w") as token:
-        token.write(creds.to_json())
-    else:
-      flow = InstalledAppFlow.from_client_secrets_file(
-        settings.google_credentials_file, 
-        SCOPES
-      )
-
-      creds = flow.run_local_server(
-        port=8080,
-        access_type="offline",
-        prompt="consent",
-        open_browser=False  
-      )
-
-      with open(settings.google_token_file, "w") as token:
-       token.write(creds.to_json())
+    return Credentials.from_authorized_user_file(settings.google_token_file, SCOPES)
+  return None
+
+
+def _save_creds(creds: Credentials):
+  # Пишем во временный файл рядом с токеном и атомарно подменяем,
+  # чтобы при сбое не остаться с обрезанным токеном
+  directory = path.dirname(path.abspath(settings.google_token_file))
+  fd, tmp = tempfile.mkstemp(dir=directory, prefix='.token-', suffix='.json')
+  try:
+    with os.fdopen(fd, "w") as token:
+      token.write(creds.to_json())
+    os.replace(tmp, settings.google_token_file)
+  except BaseException:
+    os.unlink(tmp)
+    raise
+
+
+def _authorize() -> Credentials:
+  flow = InstalledAppFlow.from_client_secrets_file(
+    settings.google_credentials_file, 
+    SCOPES
+  )
+
+  return flow.run_local_server(
+    port=8080,
+    access_type="offline",
+    prompt="consent",
+    open_browser=False  
+  )
+
+
+def _to_aiogoogle(creds: Credentials) -> tuple[UserCreds, ClientCreds]:
   return (
     UserCreds(
       access_token=creds.token,
@@ -67,24 +83,101 @@ def get_creds() -> tuple[UserCreds, ClientCreds]:
       scopes=creds.scopes
     )
   )
+
+
+class CredentialProvider:
+  def __init__(self, refresh_margin: timedelta = REFRESH_MARGIN):
+    self.refresh_margin = refresh_margin
+    self._creds: Credentials | None = None
+    self._lock = asyncio.Lock()
+    self._refresh_task: asyncio.Task | None = None
+
+
+  async def get(self) -> tuple[UserCreds, ClientCreds]:
+    creds = self._creds
+    if creds is None or not creds.valid:
+      creds = await self._refresh()
+    elif self._expires_soon(creds):
+      # Токен ещё действует: отдаём его, а обновляем в фоне
+      if self._refresh_task is None or self._refresh_task.done():
+        self._refresh_task = asyncio.create_task(self._refresh())
+        self._refresh_task.add_done_callback(self._refresh_done)
+    return _to_aiogoogle(creds)
+
+
+  def _refresh_done(self, task: asyncio.Task):
+    # Фоновое обновление никто не ждёт: ошибку выводим сами, следующий get повторит попытку
+    if not task.cancelled() and (e := task.exception()) is not None:
+      print(f'credentials refresh failed: {e!r}')
+
+
+  def _expires_soon(self, creds: Credentials) -> bool:
+    if creds.expiry is None:
+      return False
+    # google-auth хранит expiry как naive UTC
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return creds.expiry - self.refresh_margin <= now
+
+
+  async def _refresh(self) -> Credentials:
+    async with self._lock:
+      # Пока ждали блокировку, токен мог обновить другой вызов. google-auth обновляет
+      # тот же объект Credentials, поэтому проверяем срок, а не подмену объекта
+      if self._creds and self._creds.valid and not self._expires_soon(self._creds):
+        return self._creds
+      self._creds = await asyncio.to_thread(self._obtain, self._creds)
+      return self._creds
+
+
+  def _obtain(self, creds: Credentials | None) -> Credentials:
+    if creds is None:
+      creds = _load_creds()
+      if creds and creds.valid and not self._expires_soon(creds):
+        return creds
+
+    if creds and creds.refresh_token:
+      creds.refresh(Request())
+    else:
+      creds = _authorize()
+    _save_creds(creds)
+    return creds
+
+
+creds_provider = CredentialProvider()
+
+
+async def get_creds() -> tuple[UserCreds, ClientCreds]:
+  return await creds_provider.get()
+
   
-async def list_events(calendar_id: str, from_date: datetime):
-  user_creds, client_creds = get_creds()
+def rfc3339(dt: datetime) -> str:
+  return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+async def list_events(calendar_id: str, from_date: datetime, to_date: datetime) -> dict[str, CalendarEvent]:
+  ''' События, пересекающиеся с периодом: серии целиком, вместе с их исключениями
+  и отменёнными вхождениями; серии развёртывает RecurrenceExpander.
+  '''
+  user_creds, client_creds = await get_creds()
+  items = []
   async with Aiogoogle(user_creds=user_creds, client_creds=client_creds) as aiogoogle:
     calendar_service = await aiogoogle.discover("calendar", "v3")
     pages = await aiogoogle.as_user(
       calendar_service.events.list(
         calendarId=calendar_id,
-        #timeMin=from_date.isoformat().replace("+00:00", "Z"),
+        timeMin=rfc3339(from_date),
+        timeMax=rfc3339(to_date),
+        singleEvents=False,
       ), 
       full_res=True
     )
     async for page in pages:
-      pprint(page)
+      items.extend(page.get('items', []))
+  return parse_events(items)
 
 
 async def get_calendar_id(calendar_name: str) -> str:
-  user_creds, client_creds = get_creds()
+  user_creds, client_creds = await get_creds()
   async with Aiogoogle(user_creds=user_creds, client_creds=client_creds) as aiogoogle:
     calendar_service = await aiogoogle.discover("calendar", "v3")
     pages = await aiogoogle.as_user(
@@ -103,10 +196,12 @@ if __name__ == "__main__":
    #asyncio.run(get_calendar_id(
    #  calendar_name='Bloom'
    #))
-   asyncio.run(list_events(
+   now = datetime.now(timezone.utc)
+   pprint(asyncio.run(list_events(
       calendar_id='primary',
-      from_date=datetime.now()
-   ))
+      from_date=now,
+      to_date=now + timedelta(days=7)
+   )))
 
 
 
@@ -9,6 +9,7 @@ from google.auth.transport.requests import Request # type: ignore
 from datetime import datetime, timezone
 
 from calendar_event import CalendarEvent
+from calendar_parse import parse_events
 from config import google_config  
 
 
@@ -81,34 +82,7 @@ class GoogleCalendar:
       orderBy='updated'
     ).execute()
 
-    events =  {}
-    for event in events_result.get("items", []):
-      if 'start' not in event or 'end' not in event:
-        continue
-
-      start = event['start'].get('dateTime') or event['start'].get('date')
-      end = event['end'].get('dateTime') or event['end'].get('date')
-      last_modified = event.get('updated')
-      recurrence = event.get('recurrence', [])
-      rrule = recurrence[0].lstrip('RRULE:') if recurrence else ""
-
-      calendar_event = CalendarEvent(
-        uid=event['id'],  
-        summary=event.get('summary', ''),
-        dtstart=datetime.fromisoformat(start).astimezone(timezone.utc),
-        dtend=datetime.fromisoformat(end).astimezone(timezone.utc),
-        last_modified=datetime.fromisoformat(last_modified).astimezone(timezone.utc),
-        description=event.get('description', ''),
-        location=event.get('location', ''),
-        rrule=rrule
-      )
-
-      #print(event.get('recurringEventId', None))
-      #print(event)
-
-      events[event['id']] = calendar_event
-
-    return events
+    return parse_events(events_result.get("items", []))
 
 
   def create_event(self, event: CalendarEvent) -> str:
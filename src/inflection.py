@@ -0,0 +1,156 @@
+import re
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from compendium import Compendium, PIIKind, TOKEN_RE
+
+from config import INFLECT_CACHE_SIZE
+
+if TYPE_CHECKING:
+  from pymorphy3 import MorphAnalyzer
+
+
+# Только предлоги с однозначным падежом: «в» и «на» бывают и с винительным,
+# и с предложным, «с» – с творительным и родительным, «под» – с творительным
+# и винительным; после них остаётся исходная форма
+PREPOSITIONS = {
+  **dict.fromkeys([
+    'у', 'от', 'ото', 'до', 'из', 'изо', 'без', 'для', 'около', 'после', 'кроме',
+    'возле', 'среди', 'вместо', 'мимо', 'вокруг', 'напротив',
+  ], 'gent'),
+  **dict.fromkeys(['к', 'ко', 'по', 'благодаря', 'согласно'], 'datv'),
+  **dict.fromkeys(['про', 'через', 'сквозь'], 'accs'),
+  **dict.fromkeys(['между', 'над', 'надо', 'перед', 'передо'], 'ablt'),
+  **dict.fromkeys(['о', 'об', 'обо', 'при'], 'loct'),
+  'чем': 'nomn',
+}
+
+# Предпочтительные разборы слов сущности по её виду
+PREFERRED = {
+  PIIKind.PERSON: ('Name', 'Surn', 'Patr'),
+  PIIKind.LOCATION: ('Geox',),
+}
+
+# Между токенами только запятая или союз: у однородных членов один падеж
+JOINT_RE = re.compile(r'\s*(,|\bи\b|\bили\b)\s*', re.IGNORECASE)
+# После начала текста, конца предложения или маркера списка – подлежащее
+SENTENCE_START = '.!?:\n-–—•'
+
+
+def match_case(source: str, target: str) -> str:
+  ''' Регистр и написание «е»/«ё» как в исходном слове, для составных – по частям. '''
+  if '-' in source and source.count('-') == target.count('-'):
+    return '-'.join(match_case(a, b) for a, b in zip(source.split('-'), target.split('-')))
+  if 'ё' not in source.lower():
+    target = target.replace('ё', 'е')
+  if source.isupper() and len(source) > 1:
+    return target.upper()
+  if source[:1].isupper():
+    return target[:1].upper() + target[1:]
+  return target
+
+
+class Inflector:
+  ''' Ставит снятые с маски имена и названия в падеж, которого требует ответ модели.
+  Падеж определяется по слову перед токеном: предлогу, сравнительной степени или
+  однородному ряду. Если правила нет, подставляется исходный текст, как и без склонения.
+  Формы кэшируются по лемме, исходному тексту и граммемам.
+  '''
+  def __init__(self, morph: 'MorphAnalyzer', maxsize: int = INFLECT_CACHE_SIZE):
+    self.morph = morph
+    self.inflect = lru_cache(maxsize)(self._inflect)
+    self.case_after = lru_cache(maxsize)(self._case_after)
+
+
+  def _case_after(self, word: str) -> str | None:
+    if case := PREPOSITIONS.get(word):
+      return case
+    if 'COMP' in self.morph.parse(word)[0].tag:
+      return 'gent'
+    return None
+
+
+  def surface_gender(self, text: str) -> str | None:
+    ''' Пол по фамилии или отчеству в исходном тексте; None, если он неоднозначен
+    («Иванова» – и родительный мужской, и именительный женский).
+    '''
+    genders = {
+      p.tag.gender
+      for w in text.split()
+      for p in self.morph.parse(w)
+      if {'Surn', 'Patr'} & p.tag.grammemes and 'sing' in p.tag and p.tag.gender
+    }
+    return genders.pop() if len(genders) == 1 else None
+
+
+  def _inflect(self, lemma: str, text: str, kind: PIIKind, grammemes: frozenset[str]) -> str | None:
+    preferred = PREFERRED.get(kind, ())
+    parses = [self.morph.parse(w) for w in lemma.split()]
+    chosen = [next((p for p in ps if any(g in p.tag for g in preferred)), ps[0]) for ps in parses]
+    # Пол берётся из имени, без имени – из исходной формы: лемма фамилии у pymorphy всегда мужская
+    gendered = any({'Surn', 'Patr'} & p.tag.grammemes for p in chosen)
+    gender = next((p.tag.gender for p in chosen if 'Name' in p.tag and p.tag.gender), None)
+    if gendered and gender is None and (gender := self.surface_gender(text)) is None:
+      return None
+    words = []
+    for p in chosen:
+      form = None
+      if gendered and {'Surn', 'Patr'} & p.tag.grammemes:
+        form = p.inflect(grammemes | {gender})
+      form = form or p.inflect(grammemes)
+      if form is None:
+        return None
+      words.append(form.word)
+    return ' '.join(words)
+
+
+  def case_at(self, text: str, start: int) -> str | None:
+    # Хватает нескольких символов перед токеном, весь текст не просматривается
+    before = text[max(0, start - 32):start].rstrip(' \t*_"«(')
+    if not before or before[-1] in SENTENCE_START:
+      return 'nomn'
+    word = before.rsplit(maxsplit=1)[-1].strip(',;()"«»')
+    if word.isalpha():
+      return self.case_after(word.lower())
+    return None
+
+
+  def in_list(self, text: str, last_end: int, m: re.Match) -> bool:
+    ''' Токен m – следующий член однородного ряда после токена, кончившегося в last_end.
+    После союза – последний член ряда. После запятой ряд есть, только если за токеном
+    снова запятая или союз и токен: «Кроме ⟪A⟫, ⟪B⟫ пришла» – не ряд.
+    '''
+    if (joint := JOINT_RE.fullmatch(text, last_end, m.start())) is None:
+      return False
+    if joint.group(1) != ',':
+      return True
+    after = JOINT_RE.match(text, m.end())
+    return after is not None and TOKEN_RE.match(text, after.end()) is not None
+
+
+  def reconstruct(self, comp: Compendium, text: str) -> str:
+    last_end, last_case = -1, None
+
+    def sub(m: re.Match) -> str:
+      nonlocal last_end, last_case
+      s = comp.get(m.group(0))
+      if s is None:
+        return m.group(0)
+      if last_case and self.in_list(text, last_end, m):
+        case = last_case
+      else:
+        case = self.case_at(text, m.start())
+      last_end, last_case = m.end(), case
+
+      if case is None or s.kind not in PREFERRED:
+        return s.text
+      form = self.inflect(s.lemma, s.text, s.kind, frozenset({case}))
+      if form is None:
+        return s.text
+      surface = s.text.split()
+      words = form.split()
+      if len(surface) == len(words):
+        return ' '.join(match_case(a, b) for a, b in zip(surface, words))
+      return form.title()
+
+    return TOKEN_RE.sub(sub, text)
@@ -1,34 +1,53 @@
 from langchain_core.language_models import BaseChatModel
-from langchain_deepseek import ChatDeepSeek
-from langchain_gigachat import GigaChat
-from langchain_openai import ChatOpenAI
-from langchain_community.chat_models import ChatYandexGPT
 
-from config import settings
+from config import (
+  settings,
+  LLM_HEDGE,
+  LLM_ROUTE,
+  LLM_TIMEOUT
+)
 
 
 def get_llm(model_name: str) -> BaseChatModel:
+    # SDK провайдеров импортируются только для выбранной модели:
+    # вместе они заметно замедляют запуск
     if model_name == 'deepseek':
+      from langchain_deepseek import ChatDeepSeek
       return ChatDeepSeek(
         api_key=settings.deepseek_api_key,
         model=settings.deepseek_model, 
       )
     elif model_name == 'gigachat':
+      from langchain_gigachat import GigaChat
       return GigaChat(
         credentials=settings.gigachat_api_key, 
         model=settings.gigachat_model, 
         verify_ssl_certs=False, 
       )
     elif model_name == 'yandexgpt':
+      from langchain_community.chat_models import ChatYandexGPT
       return ChatYandexGPT(
         api_key=settings.yandexgpt_api_key, 
         model_uri=settings.yandexgpt_model, 
       ) 
     elif model_name == 'openrouter':
+      from langchain_openai import ChatOpenAI
       return ChatOpenAI(
         base_url='https://openrouter.ai/api/v1',
         api_key=settings.openrouter_api_key, 
         model=settings.openrouter_model, 
       )
+    elif model_name == 'router':
+      from router import RoutedChatModel
+      return RoutedChatModel.from_names(LLM_ROUTE, timeout=LLM_TIMEOUT, hedge=LLM_HEDGE)
+    elif model_name == 'fake':
+      from fake_llm import FakeChatModel
+      return FakeChatModel(
+        latency=settings.fake_latency,
+        latency_mean=settings.fake_latency_mean,
+        latency_spread=settings.fake_latency_spread,
+        chunk_delay=settings.fake_chunk_delay,
+        seed=settings.fake_seed,
+      )
     else:
       raise ValueError(f'Unknown model name: {model_name}') 
\ No newline at end of file
@@ -1,4 +1,5 @@
 import asyncio
+import argparse
 from typing import (
   TypedDict,
   Sequence,
@@ -23,11 +24,12 @@ from langgraph.graph import (
 from langgraph.prebuilt import ToolNode
 
 from llm import get_llm
-from config import settings, SYSTEM_PROMPT
+from config import settings, LLM_MODEL, SYSTEM_PROMPT
 from masking import Masker
 from compendium import Compendium
 import tools
 import utils
+from metrics import metrics
 
 
 @dataclass
@@ -40,6 +42,7 @@ class AgentState(TypedDict):
   messages: Annotated[Sequence[BaseMessage], add_messages]
 
 
+@metrics.timed('node', node='mask')
 async def mask(state: AgentState) -> AgentState:
   print('masking.....')
   print(state['messages'])
@@ -50,6 +53,7 @@ async def mask(state: AgentState) -> AgentState:
   return {'messages': state['messages']}
 
 
+@metrics.timed('node', node='unmask')
 async def unmask(state: AgentState) -> AgentState:
   print('unmasking.....')
   runtime = get_runtime(Context)
@@ -59,6 +63,7 @@ async def unmask(state: AgentState) -> AgentState:
   return {'messages': state['messages']}
 
 
+@metrics.timed('node', node='llm')
 async def call_model(state: AgentState) -> AgentState:
   print('calling model.....')
   runtime = get_runtime(Context)
@@ -80,25 +85,20 @@ async def carry_on(state: AgentState) -> bool:
   return False
 
 
-@utils.how_long('seconds')
-async def main():
-  masker = Masker(comp=comp)
+PROMPT = 'Кто старше Петр Емельянов или Александр Митрофанов?'
+
 
-  tools = [
-    show_schedule, 
-    current_datetime, 
-    relationships, 
-    age, 
-    compare
-  ]
+@utils.how_long('seconds')
+async def main(model_name: str = LLM_MODEL, prompt: str = PROMPT):
+  masker = Masker(comp=tools.compendium())
 
-  llm = get_llm('gigachat').bind_tools(tools)
+  llm = get_llm(model_name).bind_tools(tools.tools)
 
   graph = StateGraph(AgentState)
   graph.add_node('masker', mask)
   graph.add_node('unmasker', unmask)
   graph.add_node('llm', call_model)
-  graph.add_node('tools', ToolNode(tools=tools))
+  graph.add_node('tools', ToolNode(tools=tools.tools))
   
   graph.add_edge(START, 'masker')
   graph.add_edge('masker', 'llm')
@@ -120,7 +120,7 @@ async def main():
     input={
       'messages': [
         HumanMessage(
-          content='Кто старше Петр Емельянов или Александр Митрофанов?'
+          content=prompt
         )
       ]
     },
@@ -149,8 +149,23 @@ async def main():
       print("\n=== Финальный ответ не найден ===")
 
   print("\n\n=== Compendium ===")
-  print(comp)
+  print(tools.compendium())
+
+
+async def session(model_name: str):
+  # gather запускает каждую сессию в своей копии контекста:
+  # компендиум сессии виден её узлам и инструментам, но не соседним
+  tools.current_comp.set(Compendium())
+  await main(model_name)
+
+
+async def run_sessions(model_name: str, sessions: int):
+  await asyncio.gather(*[session(model_name) for _ in range(sessions)])
 
 
 if __name__ == '__main__':
-  asyncio.run(main())
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--model', default=LLM_MODEL, help="deepseek, gigachat, yandexgpt, openrouter или fake")
+  parser.add_argument('--sessions', type=int, default=1, help='число одновременных сессий')
+  args = parser.parse_args()
+  asyncio.run(run_sessions(args.model, args.sessions))
@@ -1,20 +1,47 @@
 import re
-import uuid
-from presidio_analyzer import (
-  AnalyzerEngine,
-  RecognizerResult,
-)
-from presidio_analyzer.nlp_engine import NlpEngineProvider
-from pymorphy3 import MorphAnalyzer
+from functools import cache
+from typing import TYPE_CHECKING, Sequence
 
 from compendium import (
   Substitution,
   Compendium,
   PIIKind
 )
+from inflection import Inflector
+
+from config import (
+  PII_DISABLED_RECOGNIZERS,
+  PII_ENTITIES,
+  PII_RECOGNIZERS,
+  PII_SCORE_THRESHOLD,
+  UNMASK_INFLECT
+)
+
+# Presidio, spaCy и pymorphy3 тяжёлые: импортируются при первом маскировании
+if TYPE_CHECKING:
+  from presidio_analyzer import AnalyzerEngine, RecognizerResult
+  from presidio_analyzer.nlp_engine import NlpArtifacts
+  from pymorphy3 import MorphAnalyzer
+
+
+# Сущность Presidio -> вид токена; распознаватели из PII_RECOGNIZERS добавляют свои
+ENTITY_KINDS = {
+  'PERSON': PIIKind.PERSON,
+  'LOCATION': PIIKind.LOCATION,
+  'EMAIL_ADDRESS': PIIKind.EMAIL,
+  'PHONE_NUMBER': PIIKind.PHONE,
+  'IBAN_CODE': PIIKind.IBAN,
+  **{r['supported_entity']: PIIKind(r['kind']) for r in PII_RECOGNIZERS},
+}
 
+# Леммы нужны только словам: по ним инструменты ищут людей и города
+LEMMATIZED = {PIIKind.PERSON, PIIKind.LOCATION}
+
+
+def create_analyzer() -> 'AnalyzerEngine':
+  from presidio_analyzer import AnalyzerEngine, PatternRecognizer
+  from presidio_analyzer.nlp_engine import NlpEngineProvider
 
-def create_analyzer() -> AnalyzerEngine:
   provider = NlpEngineProvider(
     nlp_configuration={
       'nlp_engine_name': 'spacy',
@@ -23,34 +50,125 @@ def create_analyzer() -> AnalyzerEngine:
       ],
   })
   nlp_engine = provider.create_engine()
-  return AnalyzerEngine(nlp_engine=nlp_engine, supported_languages=['ru'])
+  analyzer = AnalyzerEngine(
+    nlp_engine=nlp_engine,
+    supported_languages=['ru'],
+    default_score_threshold=PII_SCORE_THRESHOLD,
+  )
+  for name in PII_DISABLED_RECOGNIZERS:
+    analyzer.registry.remove_recognizer(name)
+  for r in PII_RECOGNIZERS:
+    config = {k: v for k, v in r.items() if k != 'kind'}
+    analyzer.registry.add_recognizer(PatternRecognizer.from_dict({**config, 'supported_language': 'ru'}))
+  return analyzer
 
 
-def make_token(kind: PIIKind) -> str:
-  tok = str(uuid.uuid4())[:8]
-  return f'⟪PII:{kind}:{tok}⟫'
-  
+@cache
+def get_analyzer() -> 'AnalyzerEngine':
+  ''' Анализатор на процесс: модель spaCy загружается один раз для всех сессий. '''
+  return create_analyzer()
+
+
+@cache
+def get_morph() -> 'MorphAnalyzer':
+  from pymorphy3 import MorphAnalyzer
+  return MorphAnalyzer()
+
+
+@cache
+def get_inflector() -> Inflector:
+  return Inflector(get_morph())
+
+
+@cache
+def pattern_entities() -> frozenset[str]:
+  ''' Сущности, которые находят распознаватели без модели spaCy. '''
+  from presidio_analyzer.predefined_recognizers import SpacyRecognizer
+  return frozenset(
+    e
+    for r in get_analyzer().registry.get_recognizers('ru', all_fields=True)
+    if not isinstance(r, SpacyRecognizer)
+    for e in r.supported_entities
+  )
+
+
+def non_overlapping(spans: list['RecognizerResult']) -> list['RecognizerResult']:
+  ''' Распознаватели возвращают результаты вперемешку и с пересечениями (адрес почты и URL в нём):
+  из пересекающихся остаётся более уверенный, при равной уверенности – более длинный.
+  Результат упорядочен по началу.
+  '''
+  kept: list['RecognizerResult'] = []
+  for s in sorted(spans, key=lambda s: (-s.score, s.start - s.end, s.start)):
+    if all(s.end <= k.start or k.end <= s.start for k in kept):
+      kept.append(s)
+  return sorted(kept, key=lambda s: s.start)
+
+
+def check_entities(entities: Sequence[str]):
+  # Presidio понимает пустой список как «все сущности»: такой запрос ошибочен, а не пуст
+  if not entities:
+    raise ValueError(f'No entities to mask; known: {", ".join(ENTITY_KINDS)}')
+  if unknown := [e for e in entities if e not in ENTITY_KINDS]:
+    raise ValueError(f'Unknown entities: {", ".join(unknown)}; known: {", ".join(ENTITY_KINDS)}')
+
 
 class Masker:
-  def __init__(self, comp: Compendium):
-    self.morph = MorphAnalyzer()
-    self.analyzer = create_analyzer()
+  ''' entities – сущности Presidio, которые маскируются, если вызов не задал свои. '''
+  def __init__(self, comp: Compendium, entities: Sequence[str] = PII_ENTITIES):
+    check_entities(entities)
     self.comp = comp
+    self.entities = list(entities)
+
+
+  @property
+  def analyzer(self) -> 'AnalyzerEngine':
+    return get_analyzer()
 
 
-  def mask(self, text: str) -> str:
-    spans: list[RecognizerResult] = self.analyzer.analyze(
+  @property
+  def morph(self) -> 'MorphAnalyzer':
+    return get_morph()
+
+
+  def mask(self, text: str, entities: Sequence[str] | None = None) -> str:
+    entities = self._entities(entities)
+    spans: list['RecognizerResult'] = self.analyzer.analyze(
       text=text,
-      entities=[
-        'PERSON', 'EMAIL_ADDRESS', 'LOCATION'
-      ],
+      entities=entities,
       language='ru',
+      nlp_artifacts=self._tokens_only(text, entities),
     )
 
     return self._replace(text, spans)
+
+
+  def mask_batch(
+    self,
+    texts: list[str],
+    batch_size: int = 32,
+    entities: Sequence[str] | None = None
+  ) -> list[str]:
+    from presidio_analyzer import BatchAnalyzerEngine
+
+    entities = self._entities(entities)
+    if not self._needs_nlp(entities):
+      return [self.mask(t, entities) for t in texts]
+
+    # Тексты проходят через spaCy одним пакетом (nlp.pipe),
+    # а не по одному вызову на текст
+    batch = BatchAnalyzerEngine(analyzer_engine=self.analyzer)
+    results = batch.analyze_iterator(
+      texts=texts,
+      language='ru',
+      batch_size=batch_size,
+      entities=entities,
+    )
+    return [self._replace(t, spans) for t, spans in zip(texts, results)]
   
 
-  def unmask(self, text: str) -> str:
+  def unmask(self, text: str, inflect: bool = UNMASK_INFLECT) -> str:
+    if inflect:
+      return get_inflector().reconstruct(self.comp, text)
     return self.comp.reconstruct(text)
   
 
@@ -62,6 +180,37 @@ class Masker:
     return self.comp.as_tree()  
   
 
+  def _entities(self, entities: Sequence[str] | None) -> list[str]:
+    if entities is None:
+      return self.entities
+    check_entities(entities)
+    return list(entities)
+
+
+  def _needs_nlp(self, entities: list[str]) -> bool:
+    return not pattern_entities().issuperset(entities)
+
+
+  def _tokens_only(self, text: str, entities: list[str]) -> 'NlpArtifacts | None':
+    ''' Для сущностей по шаблонам полный конвейер spaCy не нужен: хватает токенизатора,
+    чтобы Presidio нашёл слова контекста рядом с совпадением.
+    '''
+    from presidio_analyzer.nlp_engine import NlpArtifacts
+
+    if self._needs_nlp(entities):
+      return None
+    engine = self.analyzer.nlp_engine
+    doc = engine.nlp['ru'].tokenizer(text)
+    return NlpArtifacts(
+      entities=[],
+      tokens=doc,
+      tokens_indices=[t.idx for t in doc],
+      lemmas=[t.lower_ for t in doc],
+      nlp_engine=engine,
+      language='ru',
+    )
+
+
   def _lemmatize(self, text: str) -> str:
     lemmas = []
     for w in text.split():
@@ -69,17 +218,18 @@ class Masker:
     return ' '.join(lemmas)
   
 
-  def _replace(self, text: str, spans: list[RecognizerResult]) -> str:
+  def _replace(self, text: str, spans: list['RecognizerResult']) -> str:
     curr = 0
     chunks = []
-    for s in spans:
+    for s in non_overlapping(spans):
+      kind = ENTITY_KINDS[s.entity_type]
       chunks.append(text[curr:s.start])
-      token = make_token(PIIKind(s.entity_type))
+      token = self.comp.make_token(kind)
       self.comp.add(
         Substitution(
           text=text[s.start: s.end],
-          lemma=self._lemmatize(text[s.start: s.end]),
-          kind=PIIKind(s.entity_type),
+          lemma=self._lemmatize(text[s.start: s.end]) if kind in LEMMATIZED else text[s.start: s.end],
+          kind=kind,
           token=token,
         )
       )
@@ -0,0 +1,96 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+
+from fastmcp import FastMCP, Context
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+
+import tools
+from cache import TTLCache
+from compendium import Compendium
+from masking import Masker, get_analyzer, get_morph
+from persistence import open_compendium
+
+from config import (
+  MCP_HOST,
+  MCP_PORT,
+  MCP_SESSIONS,
+  MCP_SESSION_TTL
+)
+
+
+# Компендиум на MCP-сессию: токены одного клиента не видны другим
+sessions = TTLCache(MCP_SESSIONS, MCP_SESSION_TTL)
+
+
+def session_compendium(ctx: Context) -> Compendium:
+  if (comp := sessions.get(ctx.session_id)) is None:
+    comp = open_compendium(ctx.session_id)
+  sessions.put(ctx.session_id, comp)
+  return comp
+
+
+class SessionCompendium(Middleware):
+  ''' Перед каждым вызовом инструмента делает компендиум сессии текущим для tools. '''
+  async def on_call_tool(self, context: MiddlewareContext, call_next):
+    if context.fastmcp_context is not None:
+      tools.current_comp.set(session_compendium(context.fastmcp_context))
+    return await call_next(context)
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+  # Модель spaCy загружается один раз при старте и общая для всех клиентов
+  await asyncio.to_thread(get_analyzer)
+  await asyncio.to_thread(get_morph)
+  yield
+
+
+mcp = FastMCP(
+  'multifora',
+  instructions=(
+    'Маскирование персональных данных и инструменты над замаскированными токенами ⟪PII:*⟫. '
+    'Токены действуют в пределах сессии.'
+  ),
+  lifespan=lifespan,
+  middleware=[SessionCompendium()],
+)
+
+
+@mcp.tool
+async def mask(text: str, entities: list[str] | None = None) -> str:
+  ''' Заменяет персональные данные в тексте на токены вида "⟪PII:KIND:*⟫".
+  entities – какие сущности искать (PERSON, LOCATION, EMAIL_ADDRESS, PHONE_NUMBER,
+  RU_PASSPORT, IBAN_CODE); без PERSON и LOCATION текст не проходит через модель spaCy.
+  '''
+  # spaCy работает в потоке, чтобы не останавливать обработку других запросов
+  return await asyncio.to_thread(Masker(comp=tools.compendium()).mask, text, entities)
+
+
+@mcp.tool
+async def mask_batch(texts: list[str], entities: list[str] | None = None) -> list[str]:
+  ''' Маскирует список текстов одним пакетом; entities – как в mask. '''
+  masker = Masker(comp=tools.compendium())
+  return await asyncio.to_thread(masker.mask_batch, texts, entities=entities)
+
+
+@mcp.tool
+async def unmask(text: str) -> str:
+  ''' Заменяет токены "⟪PII:KIND:*⟫" этой сессии на исходный текст. '''
+  return Masker(comp=tools.compendium()).unmask(text)
+
+
+@mcp.tool
+async def lookup(token: str) -> dict | None:
+  ''' Возвращает подстановку для токена "⟪PII:KIND:*⟫": текст, лемму и вид. '''
+  if s := tools.compendium().get(token):
+    return asdict(s)
+  return None
+
+
+for t in tools.tools:
+  mcp.tool(t.coroutine, name=t.name, description=t.description)
+
+
+if __name__ == '__main__':
+  mcp.run(transport='http', host=MCP_HOST, port=MCP_PORT)
@@ -0,0 +1,186 @@
+import json
+from functools import cache
+from typing import Callable
+
+from langchain_core.messages import (
+  AIMessage,
+  BaseMessage,
+  HumanMessage,
+  RemoveMessage,
+  SystemMessage,
+  ToolMessage,
+)
+from langchain_core.messages.utils import (
+  count_tokens_approximately,
+  trim_messages,
+)
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+
+from compendium import TOKEN_RE
+from config import (
+  CHECKPOINTER,
+  CHECKPOINT_DB,
+  HISTORY_KEEP_MESSAGES,
+  PROMPT_TOKENIZER,
+  TOOL_RESULT_OLD_CHARS,
+)
+
+# Служебные токены на каждое сообщение (роль, разделители)
+MESSAGE_OVERHEAD = 3
+
+
+SUMMARY_PROMPT = (
+  "Кратко перескажи диалог пользователя и ассистента, сохранив факты, "
+  "нужные для продолжения разговора. Подстроки в скобках ⟪ и ⟫ переноси дословно."
+)
+
+
+@cache
+def get_checkpointer() -> BaseCheckpointSaver:
+  # Один экземпляр на процесс: история сессий общая для всех страниц
+  if CHECKPOINTER == 'memory':
+    return InMemorySaver()
+  elif CHECKPOINTER == 'sqlite':
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    return AsyncSqliteSaver(aiosqlite.connect(CHECKPOINT_DB))
+  else:
+    raise ValueError(f'Unknown checkpointer: {CHECKPOINTER}')
+
+
+@cache
+def token_counter() -> Callable[[list[BaseMessage]], int]:
+  ''' Счётчик токенов промпта по словарю PROMPT_TOKENIZER.
+  Без tiktoken или без файла словаря (например, офлайн) – приблизительная оценка.
+  '''
+  if not PROMPT_TOKENIZER:
+    return count_tokens_approximately
+  try:
+    import tiktoken
+    encoding = tiktoken.get_encoding(PROMPT_TOKENIZER)
+  except Exception:
+    return count_tokens_approximately
+
+  def count(messages: list[BaseMessage]) -> int:
+    total = 0
+    for m in messages:
+      total += MESSAGE_OVERHEAD + len(encoding.encode(m.text(), disallowed_special=()))
+      if isinstance(m, AIMessage) and m.tool_calls:
+        calls = [{'name': c['name'], 'args': c['args']} for c in m.tool_calls]
+        total += len(encoding.encode(json.dumps(calls, ensure_ascii=False), disallowed_special=()))
+    return total
+  return count
+
+
+def shorten(text: str, max_chars: int) -> str:
+  ''' Обрезает текст до max_chars, не разрывая токены ⟪PII:...⟫.
+  Токены из отброшенной части перечисляются в конце, чтобы модель могла на них ссылаться.
+  '''
+  if len(text) <= max_chars:
+    return text
+  head = text[:max_chars]
+  if (opened := head.rfind('⟪')) > head.rfind('⟫'):
+    head = head[:opened]
+  kept = set(TOKEN_RE.findall(head))
+  dropped = list(dict.fromkeys(t for t in TOKEN_RE.findall(text[len(head):]) if t not in kept))
+  tail = f' …[сокращено {len(text) - len(head)} симв.'
+  if dropped:
+    tail += f'; токены: {", ".join(dropped)}'
+  return head + tail + ']'
+
+
+class PromptTooLong(ValueError):
+  ''' Текущий ход не помещается в бюджет промпта даже с сокращёнными результатами инструментов. '''
+
+
+def compact_tool_results(
+  messages: list[BaseMessage],
+  max_chars: int = TOOL_RESULT_OLD_CHARS,
+  keep_last: bool = True
+) -> list[BaseMessage]:
+  ''' Сокращает результаты инструментов всех раундов, кроме последнего (с keep_last=False – всех).
+  Сообщения в состоянии не меняются: длинные заменяются копиями.
+  '''
+  last = len(messages)
+  for i in range(len(messages) - 1, -1, -1):
+    if keep_last and isinstance(messages[i], AIMessage) and messages[i].tool_calls:
+      last = i
+      break
+  compacted = []
+  for i, m in enumerate(messages):
+    if i < last and isinstance(m, ToolMessage) and len(text := m.text()) > max_chars:
+      m = m.model_copy(update={'content': shorten(text, max_chars)})
+    compacted.append(m)
+  return compacted
+
+
+def turn_start(messages: list[BaseMessage]) -> int:
+  for i in range(len(messages) - 1, -1, -1):
+    if isinstance(messages[i], HumanMessage):
+      return i
+  return 0
+
+
+def prompt_window(
+  messages: list[BaseMessage],
+  max_tokens: int,
+  counter: Callable[[list[BaseMessage]], int] = count_tokens_approximately
+) -> list[BaseMessage]:
+  ''' Текущий ход целиком плюс столько предыдущих ходов, сколько помещается в max_tokens.
+  Результаты прошлых раундов вызовов инструментов сокращаются. Если ход сам не помещается,
+  сокращаются и результаты последнего раунда; не помогло – PromptTooLong.
+  '''
+  messages = compact_tool_results(messages)
+  start = turn_start(messages)
+  history, current = messages[:start], messages[start:]
+  budget = max_tokens - counter(current)
+  if budget < 0:
+    current = compact_tool_results(current, keep_last=False)
+    if (tokens := counter(current)) > max_tokens:
+      raise PromptTooLong(f'ход занимает {tokens} токенов при бюджете {max_tokens}')
+    return current
+  if not history or budget == 0:
+    return current
+  return trim_messages(
+    history,
+    max_tokens=budget,
+    token_counter=counter,
+    strategy='last',
+    start_on='human',
+  ) + current
+
+
+def split_for_summary(messages: list[BaseMessage]) -> tuple[list[BaseMessage], list[BaseMessage]]:
+  ''' Делит историю на старую часть для пересказа и последние сообщения.
+  Граница сдвигается к началу хода, чтобы не отрывать ответы инструментов от вызовов.
+  '''
+  cut = max(0, len(messages) - HISTORY_KEEP_MESSAGES)
+  while cut < len(messages) and not isinstance(messages[cut], HumanMessage):
+    cut += 1
+  return messages[:cut], messages[cut:]
+
+
+def summary_prompt(summary: str, messages: list[BaseMessage]) -> list[BaseMessage]:
+  lines = []
+  if summary:
+    lines.append(f'Ранее: {summary}')
+  for m in messages:
+    if content := m.text():
+      lines.append(f'{m.type}: {content}')
+  return [SystemMessage(content=SUMMARY_PROMPT), HumanMessage(content='\n'.join(lines))]
+
+
+def removals(messages: list[BaseMessage]) -> list[RemoveMessage]:
+  return [RemoveMessage(id=m.id) for m in messages]
+
+
+def turns(messages: list[BaseMessage]) -> list[tuple[str, str | None]]:
+  ''' Вопросы и окончательные ответы ходов истории, без вызовов инструментов. '''
+  result = []
+  for m in messages:
+    if isinstance(m, HumanMessage):
+      result.append((m.text(), None))
+    elif result and isinstance(m, AIMessage) and not m.tool_calls:
+      result[-1] = (result[-1][0], m.text())
+  return result
@@ -0,0 +1,188 @@
+import time
+import uuid
+import functools
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Protocol
+
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+trace_id: ContextVar[str | None] = ContextVar('trace_id', default=None)
+
+
+@dataclass
+class Sample:
+  name: str
+  value: float
+  trace_id: str | None
+  unit: str = 'seconds'
+  labels: dict[str, str] = field(default_factory=dict)
+  timestamp: float = field(default_factory=time.time)
+
+
+class Histogram:
+  def __init__(self, window: int = 2048):
+    self.window = deque(maxlen=window)
+    self.count = 0
+    self.sum = 0.0
+
+
+  def observe(self, value: float):
+    self.window.append(value)
+    self.count += 1
+    self.sum += value
+
+
+  def quantiles(self, qs: tuple[float, ...] = QUANTILES) -> dict[float, float]:
+    values = sorted(self.window)
+    if not values:
+      return {q: 0.0 for q in qs}
+    return {q: values[min(len(values) - 1, int(q * len(values)))] for q in qs}
+
+
+class Sink(Protocol):
+  def emit(self, sample: Sample):
+    pass
+
+
+class LogSink:
+  def emit(self, sample: Sample):
+    labels = ' '.join(f'{k}={v}' for k, v in sample.labels.items())
+    print(f'metric trace={sample.trace_id} name={sample.name} {labels} {sample.unit}={sample.value:.4f}')
+
+
+class RingBufferSink:
+  def __init__(self, size: int = 4096):
+    self.samples: deque[Sample] = deque(maxlen=size)
+
+
+  def emit(self, sample: Sample):
+    self.samples.append(sample)
+
+
+  def trace(self, tid: str) -> list[Sample]:
+    return [s for s in self.samples if s.trace_id == tid]
+
+
+  def summary(self) -> list[dict]:
+    ''' Квантили по каждому ряду: имени, единице и меткам, как в PrometheusSink. '''
+    histograms: dict[tuple[str, str, tuple[tuple[str, str], ...]], Histogram] = {}
+    for s in self.samples:
+      key = (s.name, s.unit, tuple(sorted(s.labels.items())))
+      histograms.setdefault(key, Histogram()).observe(s.value)
+    return [
+      {
+        'name': name,
+        'unit': unit,
+        'labels': dict(labels),
+        'count': h.count,
+        **{f'p{int(q * 100)}': v for q, v in h.quantiles().items()},
+      }
+      for (name, unit, labels), h in sorted(histograms.items())
+    ]
+
+
+class PrometheusSink:
+  def __init__(self, prefix: str = 'multifora', window: int = 2048):
+    self.prefix = prefix
+    self.window = window
+    self.histograms: dict[tuple[str, str, tuple[tuple[str, str], ...]], Histogram] = {}
+
+
+  def emit(self, sample: Sample):
+    key = (sample.name, sample.unit, tuple(sorted(sample.labels.items())))
+    if (h := self.histograms.get(key)) is None:
+      h = self.histograms[key] = Histogram(self.window)
+    h.observe(sample.value)
+
+
+  def render(self) -> str:
+    lines = []
+    seen = set()
+    for (name, unit, labels), h in sorted(self.histograms.items()):
+      metric = f'{self.prefix}_{name}_{unit}'
+      if metric not in seen:
+        seen.add(metric)
+        lines.append(f'# TYPE {metric} summary')
+      for q, v in h.quantiles().items():
+        lines.append(f'{metric}{self._labels(labels, quantile=q)} {v}')
+      lines.append(f'{metric}_count{self._labels(labels)} {h.count}')
+      lines.append(f'{metric}_sum{self._labels(labels)} {h.sum}')
+    return '\n'.join(lines) + '\n'
+
+
+  def _labels(self, labels: tuple[tuple[str, str], ...], **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+      return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+def make_sink(name: str) -> Sink:
+  if name == 'log':
+    return LogSink()
+  elif name == 'ring':
+    return RingBufferSink()
+  elif name == 'prometheus':
+    return PrometheusSink()
+  else:
+    raise ValueError(f'Unknown metrics sink: {name}')
+
+
+class Metrics:
+  def __init__(self, sinks: list[Sink]):
+    self.sinks = sinks
+
+
+  def configure(self, names: list[str]):
+    self.sinks = [make_sink(name) for name in names]
+
+
+  def sink(self, kind: type) -> Sink | None:
+    for s in self.sinks:
+      if isinstance(s, kind):
+        return s
+    return None
+
+
+  def start_trace(self) -> str:
+    tid = uuid.uuid4().hex[:16]
+    trace_id.set(tid)
+    return tid
+
+
+  def observe(self, name: str, value: float, unit: str = 'seconds', **labels):
+    sample = Sample(
+      name=name,
+      value=value,
+      trace_id=trace_id.get(),
+      unit=unit,
+      labels={k: str(v) for k, v in labels.items()},
+    )
+    for s in self.sinks:
+      s.emit(sample)
+
+
+  @contextmanager
+  def span(self, name: str, **labels):
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.observe(name, time.perf_counter() - start, **labels)
+
+
+  def timed(self, name: str, **labels):
+    def _decorator(func):
+      @functools.wraps(func)
+      async def _wrapper(*args, **kwargs):
+        with self.span(name, **labels):
+          return await func(*args, **kwargs)
+      return _wrapper
+    return _decorator
+
+
+metrics = Metrics(sinks=[RingBufferSink()])
@@ -1,203 +1,78 @@
 import os
 import asyncio
-from datetime import datetime
-from dataclasses import dataclass
-import json
-from typing import (
-  TypedDict,
-  Sequence,
-  Annotated,
-  Callable
-)
+import uuid
+import weakref
+from typing import Callable
 
-from langgraph.runtime import get_runtime
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import (
-  BaseMessage,
-  SystemMessage,
-  HumanMessage,
-  ToolMessage,
-  AIMessage
-)
-from langgraph.graph.message import add_messages
-from langgraph.graph import (
-  StateGraph, 
-  END, 
-  START
-)
-from langgraph.prebuilt import ToolNode
 
 from llm import get_llm
+from agent import (
+  Context,
+  ask,
+  get_graph,
+  history,
+  prewarm,
+  response_cache
+)
 from masking import Masker
+from memory import PromptTooLong
 from compendium import Compendium
+from persistence import get_store
 import tools
 from db import db, db_tree
 
-from nicegui import ui
+from fastapi.responses import JSONResponse, PlainTextResponse
+from nicegui import ui, app
 
 from config import (
   LLM_MODEL,
-  SYSTEM_PROMPT,
+  METRICS_SINKS,
   USER_AVATAR, 
-  AGENT_AVATAR,
   settings
 )
 
-from ui_steps import (
-  UITextStep,
-  UIToolCallStep,
-  UIModelResponseStep,
-  UIModelResponseJSONStep,
-  show_step
+from chat_feed import ChatFeed
+from ui_steps import StepBuffer
+from metrics import (
+  metrics,
+  PrometheusSink,
+  RingBufferSink
 )
 
 
+metrics.configure(METRICS_SINKS)
+# Модель spaCy и словари грузятся при старте, а не в первом ходе какой-нибудь страницы
+app.on_startup(prewarm)
+# Компендиум интерфейса общий для всех вкладок и переживает перезапуск
+if store := get_store():
+  store.attach('ngui', tools.comp)
+
+
 @ui.refreshable
 def compendium_tree():
   ui.tree(tools.comp.as_tree(), label_key='label')
 
 
-@dataclass
-class Context:
-  llm: BaseChatModel
-  masker: Masker
-  message_container: ui.element
-
-
-class AgentState(TypedDict):
-  messages: Annotated[Sequence[BaseMessage], add_messages]
-
-
-async def mask(state: AgentState) -> AgentState:
-  runtime = get_runtime(Context)
-  state['messages'][0].content = runtime.context.masker.mask(
-    state['messages'][0].content
-  )
-  with runtime.context.message_container:
-
-    await show_step(
-      title='Маскирую запрос', 
-      icon='ti-lock',
-      step=UITextStep(
-        text=state['messages'][0].content
-      )
-    )
-  
-  compendium_tree.refresh()
-  
-  return {'messages': state['messages']}
-
-
-async def unmask(state: AgentState) -> AgentState:
-  runtime = get_runtime(Context)
-  response = runtime.context.masker.unmask(
-    state['messages'][-1].content
-  )
-  with runtime.context.message_container:
-    await show_step(
-      title='Снимаю маски', 
-      icon='ti-unlock',
-      step=UITextStep(
-        text=response
-      )
-    )
-  return {'messages': [response]}
-
-
-async def call_model(state: AgentState) -> AgentState:
-  runtime = get_runtime(Context)
-  system_promt = SystemMessage(content=SYSTEM_PROMPT)
-  prompt = [system_promt] + list(state['messages'])
-  response = await runtime.context.llm.ainvoke(prompt)
-  with runtime.context.message_container:
-    if response.tool_calls:
-      answer = json.dumps(response.tool_calls, indent=2)
-      await show_step(
-        title='Вызываю модель',
-        icon='ti-wand',
-        step=UIModelResponseJSONStep(
-          text=answer
-        )
-      )      
-    else:
-      await show_step(
-        title='Вызываю модель',
-        icon='ti-wand',
-        step=UIModelResponseStep(
-          text=response.text()
-        )
-      )
-  
-  return {'messages': [response]}   
-
-
-async def call_tool(state: AgentState):
-  runtime = get_runtime(Context)
-  tools_by_name = {tool.name: tool for tool in tools.tools}
-  outputs = []
-  for tool_call in state["messages"][-1].tool_calls:
-    tool_result = await tools_by_name[tool_call['name']].ainvoke(tool_call['args'])
-
-    with runtime.context.message_container:
-      tool_name = tools_by_name[tool_call["name"]].name
-      await show_step(
-        title='Вызываю инструмент',
-        icon='ti-plug',
-        step=UIToolCallStep(
-          name=tool_name,
-          args=tool_call["args"],
-          result=tool_result
-        )
-      )
-
-      # Update the compendium anyway
-      compendium_tree.refresh()
-      
-      outputs.append(
-        ToolMessage(
-          content=json.dumps(tool_result),
-          name=tool_call["name"],
-          tool_call_id=tool_call["id"],
-        )
-      )
-  return {"messages": outputs}
-
-
-async def carry_on(state: AgentState) -> bool:
-  messages = state["messages"]
-  last_message = messages[-1]
-
-  # Если последнее сообщение от AI и содержит вызовы инструментов - продолжаем
-  if isinstance(last_message, AIMessage) and last_message.tool_calls:
-    return True
-
-  # Иначе заканчиваем
-  return False
-
-
 class Service:
-  def __init__(self, container: ui.element, input_element: ui.element) -> None:
+  def __init__(
+    self,
+    container: ui.element,
+    input_element: ui.element,
+    llm: BaseChatModel | None = None,
+    thread_id: str | None = None
+  ) -> None:
     self.container = container
+    self.feed = ChatFeed(container)
     self.input_element = input_element
+    self.thread_id = thread_id or uuid.uuid4().hex
 
-    self.llm = get_llm(LLM_MODEL)
+    self.llm = llm or get_llm(LLM_MODEL)
+    self.summarizer = self.llm
+    self.response_cache = response_cache
     self.tools = []
-    self.graph = StateGraph(AgentState)
-    self.graph.add_node('masker', mask)
-    self.graph.add_node('unmasker', unmask)
-    self.graph.add_node('llm', call_model)
-    self.graph.add_node('tools', call_tool)
-  
-    self.graph.add_edge(START, 'masker')
-    self.graph.add_edge('masker', 'llm')
-    self.graph.add_conditional_edges(
-      'llm', carry_on, {True: 'tools', False: 'unmasker'}
-    )
-
-    self.graph.add_edge('tools', 'llm')
-    self.graph.add_edge('unmasker', END)
     self.masker = Masker(comp=tools.comp)
-    self.app = self.graph.compile()
+    self.app = get_graph()
 
 
   def get_message(self) -> str:
@@ -220,50 +95,51 @@ class Service:
     self.llm = self.llm.bind_tools(self.tools)
 
 
+  async def restore(self) -> None:
+    ''' Выводит в ленту ходы треда из чекпоинта, сняв с них маски. '''
+    turns = await history(self.thread_id)
+    self.feed.restore([
+      (self.masker.unmask(q), a and self.masker.unmask(a))
+      for q, a in turns
+    ])
+
+
   async def invoke(self) -> None:
+    metrics.start_trace()
     with self.container:
       message = self.get_message()
-      ui.chat_message(
-        text=message,
-        name='User',
-        stamp=datetime.now().strftime('%H:%M'),
-        sent=True,
-        avatar=USER_AVATAR
-      )
-      with ui.chat_message(
-        name='Agent',
-        sent=False,
-        avatar=AGENT_AVATAR
-      ).props('bg-color=blue-2') as agent_message:
+      agent_message, turn = self.feed.ask(message)
+      with agent_message:
         spinner = ui.spinner(type='dots')
-        result = await self.app.ainvoke(
-          input={
-            'messages': [
-              HumanMessage(
-                content=message
-              )
-            ]
-          },
-          context=Context(
-            llm=self.llm, 
-            masker=self.masker,
-            message_container=agent_message
+        steps = StepBuffer(agent_message)
+        try:
+          answer = await ask(
+            message,
+            thread_id=self.thread_id,
+            context=Context(
+              llm=self.llm, 
+              masker=self.masker,
+              steps=steps,
+              summarizer=self.summarizer,
+              tool_names=tuple(t.name for t in self.tools),
+              response_cache=self.response_cache,
+              on_compendium=compendium_tree.refresh
+            )
           )
-        )
+        except PromptTooLong as e:
+          answer = f'Запрос не помещается в промпт модели: {e}'
+        steps.flush()
         agent_message.remove(spinner)
 
-      if result:
-        ui.chat_message(
-          text=result['messages'][-1].content,
-          name='Agent',
-          stamp=datetime.now().strftime('%H:%M'),
-          sent=False,
-          avatar=AGENT_AVATAR
-        )
+      self.feed.answer(turn, answer)
   
     ui.run_javascript('window.scrollTo(0, document.body.scrollHeight)')
 
 
+# Сервисы открытых страниц по id клиента; записи исчезают вместе с клиентом
+services: weakref.WeakValueDictionary[str, Service] = weakref.WeakValueDictionary()
+
+
 def make_callback(service: Service, fn: str, *args, **kwargs):
   async def cb(e) -> None:
     if fn == 'invoke':
@@ -275,8 +151,27 @@ def make_callback(service: Service, fn: str, *args, **kwargs):
   return cb
 
 
+@app.get('/metrics')
+def prometheus_metrics() -> PlainTextResponse:
+  sink = metrics.sink(PrometheusSink)
+  return PlainTextResponse(sink.render() if sink else '')
+
+
+@app.get('/metrics/traces/{tid}')
+def trace_metrics(tid: str) -> JSONResponse:
+  sink = metrics.sink(RingBufferSink)
+  samples = sink.trace(tid) if sink else []
+  return JSONResponse([
+    {'name': s.name, 'value': s.value, 'unit': s.unit, 'labels': s.labels, 'timestamp': s.timestamp}
+    for s in samples
+  ])
+
+
 @ui.page('/')
-def page_layout():
+async def page_layout(thread: str | None = None):
+  ''' thread – id сессии из чекпоинта, чтобы продолжить разговор: /?thread=<id> '''
+  resumed = thread is not None
+  thread = thread or uuid.uuid4().hex
   with ui.header(elevated=True).style('background-color: #3874c8').classes(
       'flex items-center justify-start pl-0 pr-2 py-2'):
     ui.button(on_click=lambda: left_drawer.toggle(), icon='menu') \
@@ -284,6 +179,10 @@ def page_layout():
         .classes('ml-0')
     ui.label('Homomorphic Agent').classes('ml-0')
     ui.space()
+    # Ссылка на эту сессию: по ней разговор продолжается после перезагрузки
+    ui.link(f'сессия {thread[:8]}', f'/?thread={thread}') \
+      .classes('text-white text-xs') \
+      .tooltip(thread)
     ui.button(on_click=lambda: right_drawer.toggle(), icon='menu') \
       .props('flat color=white') \
       .classes('ml-0')
@@ -315,7 +214,8 @@ def page_layout():
       text = ui.input(placeholder='message') \
         .props('rounded outlined input-class=mx-3') \
         .classes('w-full')#.classes('w-3/4')
-      svc = Service(chat_feed, text)
+      svc = Service(chat_feed, text, thread_id=thread)
+      services[ui.context.client.id] = svc
       text.on('keydown.enter', make_callback(svc, fn='invoke'))
 
   with ui.right_drawer(bottom_corner=True).style('background-color: #ebf1fa').props('bordered').classes('shrink-0') as right_drawer:
@@ -329,8 +229,11 @@ def page_layout():
               ui.label(t.name)
             ui.label(t.description).classes('text-xs font-light px-3')
 
+  if resumed:
+    await svc.restore()
 
-ui.add_head_html('<link href="https://cdn.jsdelivr.net/themify-icons/0.1.2/css/themify-icons.css" rel="stylesheet" />', shared=True)
 
-ui.run()
+ui.add_head_html('<link href="https://cdn.jsdelivr.net/themify-icons/0.1.2/css/themify-icons.css" rel="stylesheet" />', shared=True)
 
+if __name__ in {'__main__', '__mp_main__'}:
+  ui.run()
@@ -0,0 +1,186 @@
+import os
+import json
+import hashlib
+import threading
+from pathlib import Path
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from functools import cache
+from dataclasses import asdict
+
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
+
+from compendium import Compendium, Substitution, PIIKind
+
+from config import (
+  COMPENDIUM_DIR,
+  COMPENDIUM_FSYNC,
+  COMPENDIUM_SNAPSHOT_EVERY,
+  settings
+)
+
+
+def encode(fernet: MultiFernet, substitutions: list[Substitution]) -> bytes:
+  return fernet.encrypt(json.dumps([asdict(s) for s in substitutions], ensure_ascii=False).encode())
+
+
+def decode(fernet: MultiFernet, data: bytes) -> list[Substitution]:
+  return [
+    Substitution(text=s['text'], lemma=s['lemma'], kind=PIIKind(s['kind']), token=s['token'])
+    for s in json.loads(fernet.decrypt(data))
+  ]
+
+
+class FileJournal:
+  ''' Журнал подстановок одной сессии: append-only файл .wal, где каждая строка –
+  отдельно зашифрованная порция подстановок, и снимок .snap со всем компендиумом.
+  Каждые snapshot_every записей журнал сжимается: снимок пишется заново, .wal обнуляется.
+  Шифрование и запись идут в потоке writer, а не в том, кто добавил подстановку:
+  add вызывается и из цикла событий. Один поток writer сохраняет порядок записей.
+  '''
+  def __init__(
+    self,
+    comp: Compendium,
+    path: Path,
+    fernet: MultiFernet,
+    snapshot_every: int,
+    fsync: bool,
+    writer: Executor
+  ):
+    self.comp = comp
+    self.wal = path.with_suffix('.wal')
+    self.snap = path.with_suffix('.snap')
+    self.fernet = fernet
+    self.snapshot_every = snapshot_every
+    self.fsync = fsync
+    self.writer = writer
+    self.pending = 0
+    self.lock = threading.Lock()
+    self.last: Future | None = None
+
+
+  def write(self, path: Path, data: bytes, mode: str):
+    with open(path, mode) as f:
+      f.write(data)
+      if self.fsync:
+        f.flush()
+        os.fsync(f.fileno())
+
+
+  def append(self, substitution: Substitution):
+    self.last = self.writer.submit(self._append, substitution)
+
+
+  def _append(self, substitution: Substitution):
+    line = encode(self.fernet, [substitution]) + b'\n'
+    with self.lock:
+      self.write(self.wal, line, 'ab')
+      self.pending += 1
+      if self.pending >= self.snapshot_every:
+        self.compact()
+
+
+  def compact(self):
+    # Подстановки добавляются из других потоков под блокировкой компендиума.
+    # Снимок заменяется атомарно; если процесс упадёт до обнуления .wal,
+    # повтор уже вошедших в снимок записей при загрузке ничего не меняет
+    with self.comp.lock:
+      substitutions = list(self.comp.dictionary.values())
+    tmp = self.snap.with_suffix('.tmp')
+    self.write(tmp, encode(self.fernet, substitutions), 'wb')
+    os.replace(tmp, self.snap)
+    self.write(self.wal, b'', 'wb')
+    self.pending = 0
+
+
+  def reset(self):
+    # В очереди после уже принятых записей: они не вернутся в очищенный журнал
+    self.last = self.writer.submit(self._reset)
+
+
+  def _reset(self):
+    with self.lock:
+      self.compact()
+
+
+  def flush(self):
+    ''' Ждёт, пока записи журнала попадут на диск; ошибку записи поднимает здесь. '''
+    if self.last is not None:
+      self.last.result()
+
+
+  def load(self) -> int:
+    ''' Читает снимок и журнал в компендиум; возвращает число записей журнала. '''
+    records = 0
+    if self.snap.exists():
+      for s in decode(self.fernet, self.snap.read_bytes()):
+        self.comp.add(s)
+    if self.wal.exists():
+      for line in self.wal.read_bytes().splitlines():
+        try:
+          substitutions = decode(self.fernet, line)
+        except InvalidToken:
+          # Недописанная при падении последняя строка
+          continue
+        for s in substitutions:
+          self.comp.add(s)
+        records += 1
+    return records
+
+
+class CompendiumStore:
+  ''' Компендиумы сессий на диске. Сессия читается с диска при первом обращении к ней,
+  поэтому время загрузки зависит только от числа активных сессий, а не от всех сохранённых.
+  '''
+  def __init__(
+    self,
+    root: str | Path,
+    keys: list[bytes | str],
+    snapshot_every: int = COMPENDIUM_SNAPSHOT_EVERY,
+    fsync: bool = COMPENDIUM_FSYNC
+  ):
+    self.root = Path(root)
+    self.root.mkdir(parents=True, exist_ok=True)
+    self.fernet = MultiFernet([Fernet(k) for k in keys])
+    self.snapshot_every = snapshot_every
+    self.fsync = fsync
+    # Общий для всех сессий поток записи журналов
+    self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='compendium-journal')
+
+
+  def path(self, session_id: str) -> Path:
+    # id сессии в имени файла не раскрывается
+    return self.root / hashlib.sha256(session_id.encode()).hexdigest()[:32]
+
+
+  def attach(self, session_id: str, comp: Compendium) -> Compendium:
+    ''' Загружает сохранённые подстановки сессии в comp и подключает к нему журнал. '''
+    journal = FileJournal(comp, self.path(session_id), self.fernet, self.snapshot_every, self.fsync, self.writer)
+    # Сессию могли открыть раньше: её записи из очереди должны попасть в файлы до чтения
+    self.flush()
+    comp.journal = None
+    journal.pending = journal.load()
+    comp.journal = journal
+    return comp
+
+
+  def open(self, session_id: str) -> Compendium:
+    return self.attach(session_id, Compendium())
+
+
+  def flush(self):
+    ''' Ждёт записи журналов всех сессий. '''
+    self.writer.submit(lambda: None).result()
+
+
+@cache
+def get_store() -> CompendiumStore | None:
+  if not settings.compendium_key:
+    return None
+  return CompendiumStore(COMPENDIUM_DIR, settings.compendium_key.split(','))
+
+
+def open_compendium(session_id: str) -> Compendium:
+  ''' Компендиум сессии: с диска, если хранилище настроено, иначе пустой. '''
+  if (store := get_store()) is None:
+    return Compendium()
+  return store.open(session_id)
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from dataclasses import replace
+from typing import Iterable, Iterator
+
+from dateutil.rrule import rrule, rrulestr
+
+from calendar_event import CalendarEvent
+
+from config import RECURRENCE_CACHE_SIZE
+
+
+def parse_recurrence_id(value: str) -> datetime:
+  dt = datetime.fromisoformat(value)
+  if dt.tzinfo is None:
+    dt = dt.replace(tzinfo=timezone.utc)
+  return dt.astimezone(timezone.utc)
+
+
+def overlaps(event: CalendarEvent, start: datetime, end: datetime) -> bool:
+  return event.dtstart < end and event.dtend > start
+
+
+class RecurrenceExpander:
+  ''' Разворачивает серии в вхождения по окнам. Исключения заменяют вхождения серии,
+  отменённые исключения их убирают. Развёрнутые окна хранятся в LRU на maxsize окон.
+  '''
+  def __init__(
+    self,
+    events: dict[str, CalendarEvent] | Iterable[CalendarEvent],
+    maxsize: int = RECURRENCE_CACHE_SIZE
+  ):
+    if isinstance(events, dict):
+      events = events.values()
+
+    self.singles: list[CalendarEvent] = []
+    self.series: dict[str, CalendarEvent] = {}
+    self.exceptions: dict[str, dict[datetime, CalendarEvent]] = {}
+    self._rules: dict[str, rrule] = {}
+    self.maxsize = maxsize
+    self._cache: OrderedDict[tuple[str, datetime, datetime], tuple[CalendarEvent, ...]] = OrderedDict()
+
+    for event in events:
+      if event.parent_uid and event.recurrence_id:
+        self.exceptions.setdefault(event.parent_uid, {})[
+          parse_recurrence_id(event.recurrence_id)
+        ] = event
+      elif event.cancelled:
+        continue
+      elif event.is_recurring:
+        self.series[event.uid] = event
+      else:
+        self.singles.append(event)
+
+
+  def invalidate(self, uid: str | None = None):
+    if uid is None:
+      self._rules.clear()
+      self._cache.clear()
+      return
+    self._rules.pop(uid, None)
+    for key in [k for k in self._cache if k[0] == uid]:
+      del self._cache[key]
+
+
+  def expand(self, uid: str, start: datetime, end: datetime) -> tuple[CalendarEvent, ...]:
+    ''' Возвращает вхождения серии uid, пересекающиеся с окном [start, end).
+    Вхождения, для которых есть исключения, пропускаются: исключения
+    возвращает occurrences как самостоятельные события.
+    '''
+    key = (uid, start, end)
+    if (cached := self._cache.get(key)) is not None:
+      self._cache.move_to_end(key)
+      return cached
+    cached = self._cache[key] = tuple(self._expand(self.series[uid], start, end))
+    while len(self._cache) > self.maxsize:
+      self._cache.popitem(last=False)
+    return cached
+
+
+  def occurrences(self, start: datetime, end: datetime) -> Iterator[CalendarEvent]:
+    for event in self.singles:
+      if overlaps(event, start, end):
+        yield event
+
+    for uid in self.series:
+      yield from self.expand(uid, start, end)
+
+    for exceptions in self.exceptions.values():
+      for event in exceptions.values():
+        if not event.cancelled and overlaps(event, start, end):
+          yield event
+
+
+  def schedule(self, start: datetime, end: datetime) -> list[CalendarEvent]:
+    return sorted(self.occurrences(start, end), key=lambda e: e.dtstart)
+
+
+  def _rule(self, event: CalendarEvent) -> rrule:
+    if (rule := self._rules.get(event.uid)) is None:
+      rule = self._rules[event.uid] = rrulestr(event.rrule_str, dtstart=event.dtstart)
+    return rule
+
+
+  def _expand(self, event: CalendarEvent, start: datetime, end: datetime) -> Iterator[CalendarEvent]:
+    duration = event.dtend - event.dtstart
+    exceptions = self.exceptions.get(event.uid, {})
+
+    # Вхождение, начавшееся до start, может ещё продолжаться внутри окна
+    for dt in self._rule(event).xafter(start - duration, inc=True):
+      if dt >= end:
+        break
+      if dt + duration <= start or dt in exceptions:
+        continue
+      yield replace(
+        event,
+        uid=f'{event.uid}_{dt.astimezone(timezone.utc):%Y%m%dT%H%M%SZ}',
+        dtstart=dt,
+        dtend=dt + duration,
+        parent_uid=event.uid,
+        recurrence_id=dt.isoformat(),
+        rrule=None,
+      )
@@ -0,0 +1,214 @@
+import time
+import asyncio
+from typing import Any, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from pydantic import PrivateAttr
+
+from metrics import metrics, Histogram
+
+
+class ProviderStats:
+  ''' Задержки и ошибки одного провайдера. После failures_to_trip ошибок подряд
+  провайдер на cooldown секунд уходит в конец очереди.
+  '''
+  def __init__(self, window: int = 256, failures_to_trip: int = 3, cooldown: float = 30.0):
+    self.latency = Histogram(window)
+    self.calls = 0
+    self.errors = 0
+    self.timeouts = 0
+    self.failures = 0
+    self.failures_to_trip = failures_to_trip
+    self.cooldown = cooldown
+    self.down_until = 0.0
+
+
+  def success(self, seconds: float):
+    self.calls += 1
+    self.failures = 0
+    self.latency.observe(seconds)
+
+
+  def failure(self, timeout: bool = False):
+    self.calls += 1
+    self.errors += 1
+    self.timeouts += timeout
+    self.failures += 1
+    if self.failures >= self.failures_to_trip:
+      self.down_until = time.monotonic() + self.cooldown
+
+
+  @property
+  def available(self) -> bool:
+    return time.monotonic() >= self.down_until
+
+
+  def as_dict(self) -> dict:
+    return {
+      'calls': self.calls,
+      'errors': self.errors,
+      'timeouts': self.timeouts,
+      'available': self.available,
+      **{f'p{int(q * 100)}': v for q, v in self.latency.quantiles().items()},
+    }
+
+
+class RoutedChatModel(BaseChatModel):
+  ''' Модель поверх нескольких провайдеров.
+  Провайдеры опрашиваются по порядку names: при ошибке или превышении timeout запрос
+  уходит следующему. Провайдеры с серией ошибок временно переносятся в конец.
+  С hedge=True, если основной провайдер не ответил за свой квантиль hedge_quantile
+  задержки, параллельно запрашивается следующий и берётся первый ответ.
+  '''
+  names: list[str]
+  models: list[Runnable]
+  timeout: float = 30.0
+  hedge: bool = False
+  hedge_quantile: float = 0.95
+  # Пока задержек меньше hedge_min_samples, второй провайдер ждёт hedge_default_delay
+  hedge_min_samples: int = 20
+  hedge_default_delay: float = 5.0
+
+  _stats: dict[str, ProviderStats] = PrivateAttr(default_factory=dict)
+
+
+  def model_post_init(self, context: Any):
+    for name in self.names:
+      self._stats.setdefault(name, ProviderStats())
+
+
+  @classmethod
+  def from_names(cls, names: Sequence[str], **kwargs) -> 'RoutedChatModel':
+    from llm import get_llm
+    return cls(names=list(names), models=[get_llm(n) for n in names], **kwargs)
+
+
+  @property
+  def _llm_type(self) -> str:
+    return 'routed'
+
+
+  @property
+  def model_name(self) -> str:
+    return '+'.join(self.names)
+
+
+  def bind_tools(self, tools: Sequence[Any], **kwargs) -> 'RoutedChatModel':
+    # Схемы инструментов у провайдеров разные: привязываем к каждому отдельно.
+    # Копия делит статистику с исходной моделью
+    return self.model_copy(update={
+      'models': [m.bind_tools(tools, **kwargs) for m in self.models]
+    })
+
+
+  def stats(self) -> dict[str, dict]:
+    return {name: s.as_dict() for name, s in self._stats.items()}
+
+
+  def route(self) -> list[int]:
+    ''' Порядок опроса: доступные провайдеры в заданном порядке, затем отключённые. '''
+    order = range(len(self.names))
+    return sorted(order, key=lambda i: not self._stats[self.names[i]].available)
+
+
+  def hedge_delay(self, i: int) -> float:
+    latency = self._stats[self.names[i]].latency
+    if len(latency.window) < self.hedge_min_samples:
+      return min(self.hedge_default_delay, self.timeout)
+    return latency.quantiles((self.hedge_quantile,))[self.hedge_quantile]
+
+
+  async def call(self, i: int, messages: list[BaseMessage], **kwargs) -> AIMessage:
+    name = self.names[i]
+    stats = self._stats[name]
+    start = time.perf_counter()
+    try:
+      response = await asyncio.wait_for(self.models[i].ainvoke(messages, **kwargs), self.timeout)
+    except asyncio.TimeoutError:
+      stats.failure(timeout=True)
+      metrics.observe('provider', time.perf_counter() - start, provider=name, outcome='timeout')
+      raise
+    except asyncio.CancelledError:
+      # Проигравший в хеджировании запрос ошибкой не считается
+      raise
+    except Exception:
+      stats.failure()
+      metrics.observe('provider', time.perf_counter() - start, provider=name, outcome='error')
+      raise
+    seconds = time.perf_counter() - start
+    stats.success(seconds)
+    metrics.observe('provider', seconds, provider=name, outcome='ok')
+    return response
+
+
+  async def hedged(self, first: int, second: int, messages: list[BaseMessage], **kwargs) -> AIMessage:
+    primary = asyncio.create_task(self.call(first, messages, **kwargs))
+    pending = {primary}
+    # Отмена вызывающего на любом ожидании не должна оставлять запросы висеть
+    try:
+      done, _ = await asyncio.wait(pending, timeout=self.hedge_delay(first))
+      if done:
+        if primary.exception() is None:
+          return primary.result()
+        # Быстрая ошибка основного: запасной вызывается сразу, без гонки
+        return await self.call(second, messages, **kwargs)
+
+      backup = asyncio.create_task(self.call(second, messages, **kwargs))
+      pending.add(backup)
+      error: BaseException | None = None
+      while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+          if task.exception() is None:
+            metrics.observe('hedge', 1.0, unit='wins', provider=self.names[second if task is backup else first])
+            return task.result()
+          error = task.exception()
+      raise error
+    finally:
+      for task in pending:
+        task.cancel()
+
+
+  async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+    order = self.route()
+    error: BaseException | None = None
+    start = 0
+    # stop передаётся провайдерам вместе с остальными параметрами
+    kwargs['stop'] = stop
+    if self.hedge and len(order) > 1:
+      try:
+        return self._result(await self.hedged(order[0], order[1], messages, **kwargs))
+      except Exception as e:
+        error = e
+        start = 2
+    for i in order[start:]:
+      try:
+        return self._result(await self.call(i, messages, **kwargs))
+      except Exception as e:
+        error = e
+    raise error
+
+
+  def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+    # Синхронный путь без таймаутов и хеджирования: только перебор провайдеров
+    kwargs['stop'] = stop
+    error: BaseException | None = None
+    for i in self.route():
+      stats = self._stats[self.names[i]]
+      start = time.perf_counter()
+      try:
+        response = self.models[i].invoke(messages, **kwargs)
+      except Exception as e:
+        stats.failure()
+        error = e
+        continue
+      stats.success(time.perf_counter() - start)
+      return self._result(response)
+    raise error
+
+
+  def _result(self, message: AIMessage) -> ChatResult:
+    return ChatResult(generations=[ChatGeneration(message=message)])
@@ -1,17 +1,53 @@
 import os
+import re
+import heapq
+import asyncio
+import inspect
 import functools
+from contextvars import ContextVar
+from typing import Literal
+from weakref import WeakKeyDictionary
 from pprint import pprint
 from datetime import datetime, UTC
 from langchain_core.tools import tool
 from compendium import (
   Compendium, 
   Substitution,
-  PIIKind
+  PIIKind,
+  TOKEN_RE,
+  parse_number
 )
-from masking import make_token
-from db import db
+from db import db, lookup, versions
+from cache import TTLCache
+from metrics import metrics
+from calendar_event import CalendarEvent
+from event_masking import EventMasker
+from masking import Masker
+from recurrence import RecurrenceExpander
+
+from config import CALENDAR_ID, settings
 
 comp = Compendium()
+# Компендиум текущего запроса: API заводит свой на каждую сессию,
+# страницы ngui работают с общим comp
+current_comp: ContextVar[Compendium] = ContextVar('current_comp', default=comp)
+
+
+def compendium() -> Compendium:
+  return current_comp.get()
+
+
+# Кэш маскированных событий у каждого компендиума свой и уходит вместе с ним
+event_maskers: WeakKeyDictionary[Compendium, EventMasker] = WeakKeyDictionary()
+
+def event_masker() -> EventMasker:
+  current = compendium()
+  if (masker := event_maskers.get(current)) is None:
+    masker = event_maskers[current] = EventMasker(Masker(current))
+  return masker
+
+# Токен аргумента в закэшированном результате
+ARG_RE = re.compile(r'⟪#(\d+)⟫')
 
 def log_tool(func):
   @functools.wraps(func)
@@ -20,12 +56,124 @@ def log_tool(func):
     print(f'=== calling tool: {func.__name__} ===')
     print(f'positional: {args}') 
     print(f'keyword - {kwargs}')
-    result = await func(*args, **kwargs)
+    memo = getattr(func, 'memo', None)
+    hits = memo.hits if memo else 0
+    with metrics.span('tool', tool=func.__name__):
+      result = await func(*args, **kwargs)
+    if memo:
+      hit = memo.hits > hits
+      metrics.observe('tool_cache', float(hit), unit='hits', tool=func.__name__)
+      print(f'cache: {"hit" if hit else "miss"}, hit rate {memo.hits / max(1, memo.hits + memo.misses):.0%}')
     print(f'returned: {result}')
     return result
   return wrapper
 
 
+def resolve(value):
+  ''' Ключ аргумента: токен заменяется видом и леммой подстановки, так что разные токены
+  одного объекта дают один ключ. Для неизвестного токена – KeyError.
+  '''
+  if isinstance(value, str) and TOKEN_RE.fullmatch(value):
+    if (s := compendium().get(value)) is None:
+      raise KeyError(value)
+    return (str(s.kind), s.lemma)
+  if isinstance(value, (list, tuple)):
+    return tuple(resolve(v) for v in value)
+  return value
+
+
+def arg_tokens(value, found: dict[str, int], pattern: list[int]):
+  ''' Нумерует различные токены аргументов по первому появлению; в pattern – номер
+  каждого вхождения, чтобы [A, B] и [A, A] с одинаковыми леммами давали разные ключи.
+  '''
+  if isinstance(value, str) and TOKEN_RE.fullmatch(value):
+    pattern.append(found.setdefault(value, len(found)))
+  elif isinstance(value, (list, tuple)):
+    for v in value:
+      arg_tokens(v, found, pattern)
+
+
+def rebind(value, sub):
+  if isinstance(value, str):
+    return sub(value)
+  if isinstance(value, list):
+    return [rebind(v, sub) for v in value]
+  return value
+
+
+def memoize(ttl: float, tables: tuple[str, ...] = (), maxsize: int = 4096):
+  ''' Кэширует результат инструмента по разрешённым аргументам (см. resolve).
+  Записи устаревают через ttl секунд или при изменении таблиц tables из db.
+  Токены аргументов в результате хранятся как ⟪#n⟫ и подставляются заново при попадании.
+  Кэш общий для всех компендиумов, поэтому вместе с записью хранятся подстановки
+  новых токенов результата: если в текущем компендиуме токена нет или он означает
+  другое, запись считается промахом.
+  '''
+  def _decorator(func):
+    signature = inspect.signature(func)
+    memo = TTLCache(maxsize, ttl)
+
+    @functools.wraps(func)
+    async def _wrapper(*args, **kwargs):
+      bound = signature.bind(*args, **kwargs)
+      bound.apply_defaults()
+      arguments = tuple(bound.arguments.values())
+      found: dict[str, int] = {}
+      pattern: list[int] = []
+      arg_tokens(arguments, found, pattern)
+      tokens = list(found)
+      try:
+        key = (versions(tables), resolve(arguments), tuple(pattern))
+      except KeyError:
+        return await func(*args, **kwargs)
+
+      current = compendium()
+      def valid(entry) -> bool:
+        return all((s := current.get(t)) is not None and s == stored for t, stored in entry[1])
+      cached = memo.get(key, valid=valid)
+      if cached is not None:
+        return rebind(cached[0], lambda s: ARG_RE.sub(lambda m: tokens[int(m.group(1))], s))
+
+      result = await func(*args, **kwargs)
+      if isinstance(result, (str, list)):
+        produced = set()
+        def stash(s: str) -> str:
+          def sub(m):
+            if m.group(0) in found:
+              return f'⟪#{found[m.group(0)]}⟫'
+            produced.add(m.group(0))
+            return m.group(0)
+          return TOKEN_RE.sub(sub, s)
+        stashed = rebind(result, stash)
+        memo.put(key, (stashed, tuple((t, current.get(t)) for t in produced)))
+      return result
+
+    _wrapper.memo = memo
+    return _wrapper
+  return _decorator
+
+
+def number_token(value: int | float) -> str:
+  current = compendium()
+  token = current.make_token(PIIKind.NUMBER)
+  current.add(Substitution(
+    text=str(value),
+    lemma=str(value),
+    kind=PIIKind.NUMBER,
+    token=token
+  ))
+  return token
+
+
+def lookup_numbers(tokens: list[str], table: str) -> list[str | None]:
+  ''' Разрешает токены через компендиум и ищет их леммы в таблице table одним запросом.
+  Для найденных значений заводит токены NUMBER, для остальных – None.
+  '''
+  subs = compendium().get_many(tokens)
+  values = lookup(table, [s.lemma if s else None for s in subs])
+  return [number_token(v) if v is not None else None for v in values]
+
+
 @tool
 @log_tool
 async def add(a: int, b: int) -> int:
@@ -49,9 +197,24 @@ async def current_datetime() -> datetime:
 
 @tool
 @log_tool
-async def show_schedule(from_date: datetime, to_date: datetime):
-  ''' Показывает расписание на указанный период c from_date до to_date. '''
-  pprint(f'schedule: {from_date} - {to_date}')
+async def show_schedule(from_date: datetime, to_date: datetime) -> list[str]:
+  ''' Показывает расписание на указанный период c from_date до to_date.
+  Возвращает по строке на событие: время в UTC, название, место и описание,
+  в которых имена и места заданы строками в формате "⟪PII:*⟫".
+  '''
+  from gcal import list_events
+  # Без часового пояса время считается UTC
+  from_date, to_date = (d if d.tzinfo else d.replace(tzinfo=UTC) for d in (from_date, to_date))
+  events = await list_events(CALENDAR_ID, from_date, to_date)
+  schedule = RecurrenceExpander(events).schedule(from_date, to_date)
+  # Маскирование – работа анализатора на CPU, цикл событий она не держит
+  masked = await asyncio.to_thread(event_masker().mask_events, schedule)
+  return [format_event(e) for e in masked]
+
+
+def format_event(event: CalendarEvent) -> str:
+  when = f'{event.dtstart.astimezone(UTC):%Y-%m-%d %H:%M}–{event.dtend.astimezone(UTC):%H:%M}'
+  return ' | '.join(filter(None, [when, event.summary, event.location, event.description]))
 
 
 @tool
@@ -61,8 +224,9 @@ async def relationships(t1: str, t2: str) -> str:
   объектами t1 и t2, которые заданы строками в формате "⟪PII:*⟫"
   Возвращаемое значение – строка в формате ⟪PII:RELATIONSHIP:*⟫.
   '''
-  token = make_token(PIIKind.RELATIONSHIP)
-  comp.add(Substitution(
+  current = compendium()
+  token = current.make_token(PIIKind.RELATIONSHIP)
+  current.add(Substitution(
     text='братьями',
     lemma='братья',
     kind=PIIKind.RELATIONSHIP,
@@ -81,98 +245,183 @@ async def user_name() -> str:
 
 @tool
 @log_tool
+@memoize(ttl=300, tables=('age',))
 async def age(t: str) -> str:
   ''' Возвращает информацию о возрасте объекта t, который задан строками 
   в формате "⟪PII:PERSON:*⟫". Возвращаемое значение – строка, включающая 
   возраст в формате "⟪PII:NUMBER:*⟫. ВАЖНО: на множестве объектов "⟪PII:NUMBER:*⟫" не определено отношение 
   порядка, ты не можешь сравнивать их напрямую".
   '''
-  if s := comp.get(t):
-    if age := db['age'].get(s.lemma):
-      token = make_token(PIIKind.NUMBER)
-      comp.add(Substitution(
-        text=str(age),
-        lemma=str(age),
-        kind='NUMBER',
-        token=token
-      ))
-      return f'возраст {t} – {token} лет'
+  [token] = lookup_numbers([t], 'age')
+  if token:
+    return f'возраст {t} – {token} лет'
   return f'возраст {t} неизвестен'
 
 
 @tool
 @log_tool
+@memoize(ttl=300, tables=('age',))
+async def ages(tl: list[str]) -> list[str]:
+  ''' Возвращает возраст каждого объекта из списка tl, заданных строками 
+  в формате "⟪PII:PERSON:*⟫", за один вызов. Используй вместо нескольких вызовов age. 
+  Возвращает список строк в том же порядке, каждая включает возраст в формате "⟪PII:NUMBER:*⟫". 
+  ВАЖНО: на множестве объектов "⟪PII:NUMBER:*⟫" не определено отношение порядка, ты не можешь 
+  сравнивать их напрямую.
+  '''
+  return [
+    f'возраст {t} – {token} лет' if token else f'возраст {t} неизвестен'
+    for t, token in zip(tl, lookup_numbers(tl, 'age'))
+  ]
+
+
+@tool
+@log_tool
+@memoize(ttl=600)
 async def compare(t1: str, t2: str) -> str:
   ''' Сравнивает два объекта t1 и t2, которые заданы строками 
   в формате "⟪PII:NUMBER:*⟫". Возвращает строку "GREATER", если t1 больше t2, 
   "EQUAL", если t1 равен t2, и "LESS", если t1 меньше t2, "UNKNOWN", если t1 и t2 
   не являются числами.
   '''
-  if s1 := comp.get(t1):
-    if s2 := comp.get(t2):
-      if s1.kind == s2.kind == 'NUMBER':
-        n1 = int(s1.text)
-        n2 = int(s2.text)
-        if n1 > n2:
-          return 'GREATER'
-        elif n1 == n2:
-          return 'EQUAL'
-        else:
-          return 'LESS'
-
-  return 'UNKNOWN'
+  numbers = compendium().numbers
+  n1, n2 = numbers.get(t1), numbers.get(t2)
+  if n1 is None or n2 is None:
+    return 'UNKNOWN'
+  if n1 > n2:
+    return 'GREATER'
+  elif n1 == n2:
+    return 'EQUAL'
+  else:
+    return 'LESS'
 
 
 @tool
 @log_tool
+@memoize(ttl=600)
 async def sort(tl: list[str], reverse: bool = False) -> list[str]:
   ''' Сортирует список объектов, заданых строками в формате "⟪PII:NUMBER:*⟫", 
   в порядке возрастания или убывания. Если reverse=False, то сортирует в порядке возрастания, 
   если reverse=True, то сортирует в порядке убывания. Возвращает отсортированный список объектов 
   в формате "⟪PII:NUMBER:*⟫". 
   '''
-  pairs = []
-  for t in tl:
-    if s := comp.get(t):
-      pairs.append((t, int(s.lemma)))
-    else:
-      return 'Сортировку выполнить не удалось'
+  numbers = compendium().numbers
+  values = [numbers.get(t) for t in tl]
+  if None in values:
+    return 'Сортировку выполнить не удалось'
      
-  return [p[0] for p in sorted(pairs, key=lambda x: x[1])]
+  return [t for t, _ in sorted(zip(tl, values), key=lambda x: x[1], reverse=reverse)]
+
+
+def bound(value: str | None) -> int | float | None:
+  ''' Граница диапазона: токен "⟪PII:NUMBER:*⟫" или число. '''
+  if value is None:
+    return None
+  if TOKEN_RE.fullmatch(value):
+    return compendium().number(value)
+  return parse_number(value)
 
 
 @tool
 @log_tool
+@memoize(ttl=600)
+async def rank(
+  tl: list[str],
+  k: int = 0,
+  largest: bool = True,
+  low: str | None = None,
+  high: str | None = None,
+  aggregate: Literal['min', 'max', 'sum', 'mean', 'count'] | None = None
+) -> list[str] | str:
+  ''' Ранжирует и агрегирует объекты из списка tl, заданные строками в формате "⟪PII:NUMBER:*⟫", 
+  за один вызов. Используй вместо цепочек compare и sort.
+  low и high – необязательные границы диапазона (включительно), токены "⟪PII:NUMBER:*⟫" или числа: 
+  объекты вне диапазона отбрасываются.
+  Без aggregate возвращает список объектов по убыванию (largest=True) или по возрастанию 
+  (largest=False); если k > 0 – только первые k, например k=5 и largest=True дают пять наибольших.
+  С aggregate возвращает строку: min и max – сам объект с наименьшим или наибольшим значением, 
+  sum и mean – новый объект "⟪PII:NUMBER:*⟫" с суммой или средним, count – число объектов.
+  '''
+  numbers = compendium().numbers
+  values = [numbers.get(t) for t in tl]
+  if unknown := [t for t, v in zip(tl, values) if v is None]:
+    return f'не являются числами: {", ".join(unknown)}'
+  lo, hi = bound(low), bound(high)
+  if (low is not None and lo is None) or (high is not None and hi is None):
+    return 'границы диапазона не являются числами'
+
+  pairs = [
+    (t, v) for t, v in zip(tl, values)
+    if (lo is None or v >= lo) and (hi is None or v <= hi)
+  ]
+  key = lambda p: p[1]
+
+  if aggregate == 'count':
+    return f'количество – {len(pairs)}'
+  if not pairs:
+    return 'нет объектов в заданном диапазоне'
+  if aggregate == 'min':
+    return f'минимум – {min(pairs, key=key)[0]}'
+  if aggregate == 'max':
+    return f'максимум – {max(pairs, key=key)[0]}'
+  if aggregate == 'sum':
+    return f'сумма – {number_token(sum(v for _, v in pairs))}'
+  if aggregate == 'mean':
+    return f'среднее – {number_token(round(sum(v for _, v in pairs) / len(pairs), 2))}'
+
+  if k > 0:
+    # O(n log k) вместо полной сортировки
+    top = heapq.nlargest(k, pairs, key=key) if largest else heapq.nsmallest(k, pairs, key=key)
+  else:
+    top = sorted(pairs, key=key, reverse=largest)
+  return [t for t, _ in top]
+
+
+@tool
+@log_tool
+@memoize(ttl=3600, tables=('cities',))
 async def city_area(tс: str) -> str:
   ''' Возвращает информацию о площади географического объекта tс (например, города), который 
   задан строкой в формате "⟪PII:LOCATION:*⟫". Возвращаемое значение – строка, включающая площадь 
   в формате "⟪PII:NUMBER:*⟫" ВАЖНО: на множестве объектов "⟪PII:NUMBER:*⟫" не определено отношение 
   порядка, ты не можешь сравнивать их напрямую.
   '''
-  if c := comp.get(tс):
-    if area := db['cities'].get(c.lemma):
-      token = make_token(PIIKind.NUMBER)
-      comp.add(Substitution(
-        text=str(area),
-        lemma=str(area),
-        kind='NUMBER',
-        token=token
-      ))
-      return f'площадь {tс} – {token}'
+  [token] = lookup_numbers([tс], 'cities')
+  if token:
+    return f'площадь {tс} – {token}'
   return f'площадь {tс} неизвестна'
 
 
+@tool
+@log_tool
+@memoize(ttl=3600, tables=('cities',))
+async def city_areas(tl: list[str]) -> list[str]:
+  ''' Возвращает площадь каждого географического объекта из списка tl, заданных строками 
+  в формате "⟪PII:LOCATION:*⟫", за один вызов. Используй вместо нескольких вызовов city_area. 
+  Возвращает список строк в том же порядке, каждая включает площадь в формате "⟪PII:NUMBER:*⟫". 
+  ВАЖНО: на множестве объектов "⟪PII:NUMBER:*⟫" не определено отношение порядка, ты не можешь 
+  сравнивать их напрямую.
+  '''
+  return [
+    f'площадь {t} – {token}' if token else f'площадь {t} неизвестна'
+    for t, token in zip(tl, lookup_numbers(tl, 'cities'))
+  ]
+
+
 tools = [
   #add,
   #list_files,
   #current_datetime,
-  #show_schedule,
   #relationships,
   user_name,
   age,
+  ages,
   city_area,
+  city_areas,
   compare,
-  sort
+  sort,
+  rank
 ]
 
-
+# Расписание читается из Google Calendar: без учётных данных инструмент не подключается
+if settings.google_credentials_file:
+  tools.append(show_schedule)
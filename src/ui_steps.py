@@ -1,13 +1,27 @@
 import pprint
+import asyncio
 from typing import Protocol
 
 from nicegui import ui
 
+from agent import Step
+from config import (
+  UI_STEP_FRAME,
+  UI_STEP_KEEP_OPEN,
+  UI_STEP_MAX_CHARS
+)
 from utils import (
   quote_tokens, 
   dict2args
 )
 
+
+def clip(text: str, limit: int = UI_STEP_MAX_CHARS) -> str:
+  if len(text) <= limit:
+    return text
+  return f'{text[:limit]}\n… ещё {len(text) - limit} симв.'
+
+
 class UIChatStep(Protocol):
   def show(self):
     pass
@@ -18,7 +32,7 @@ class UITextStep:
     self.text = text
   
   def show(self):
-    ui.markdown(self.text)  
+    ui.markdown(clip(self.text))  
 
 
 class UIModelResponseStep:
@@ -28,7 +42,7 @@ class UIModelResponseStep:
   def show(self):
     with ui.column().classes('w-full'):
       ui.label('Ответ модели:')
-      ui.markdown(quote_tokens(self.text))
+      ui.markdown(quote_tokens(clip(self.text)))
 
 
 class UIModelResponseJSONStep:
@@ -38,7 +52,7 @@ class UIModelResponseJSONStep:
   def show(self):
     with ui.column().classes('w-full'):
       ui.label('Ответ модели:').classes('text-gray-600 font-semibold')
-      ui.code(self.text, language='json')
+      ui.code(clip(self.text), language='json')
 
 
 class UIToolCallStep:
@@ -53,14 +67,79 @@ class UIToolCallStep:
       ui.label('Инструмент:').classes('text-gray-600 font-semibold')
       ui.code(f'{self.name}({dict2args(self.args)})').classes('py-8 w-full break-words')  
       ui.label('Результат:').classes('text-gray-600 font-semibold')
-      ui.markdown(pprint.pformat(self.result))
+      result = self.result if isinstance(self.result, str) else pprint.pformat(self.result)
+      ui.markdown(clip(result))
 
 
-async def show_step(title: str, icon: str, step: UIChatStep):
-  with ui.expansion(value=True).classes('max-w-xl self-stretch') as exp:
+def render_step(title: str, icon: str, step: UIChatStep, opened: bool = True) -> ui.expansion:
+  with ui.expansion(value=opened).classes('max-w-xl self-stretch') as exp:
     with exp.add_slot('header'):
       with ui.row().classes('items-center justify-start'):
         ui.icon(icon, size='sm', color='primary')
         ui.label(f'{title}').classes('mr-3 text-base text-blue-950')
     step.show()
+  return exp
+
+
+async def show_step(title: str, icon: str, step: UIChatStep):
+  render_step(title, icon, step)
   ui.run_javascript('window.scrollTo(0, document.body.scrollHeight)')
+
+
+def ui_step(step: Step) -> UIChatStep:
+  if step.kind == 'text':
+    return UITextStep(**step.data)
+  elif step.kind == 'model':
+    return UIModelResponseStep(**step.data)
+  elif step.kind == 'model_json':
+    return UIModelResponseJSONStep(**step.data)
+  elif step.kind == 'tool':
+    return UIToolCallStep(**step.data)
+  else:
+    raise ValueError(f'Unknown step kind: {step.kind}')
+
+
+class StepBuffer:
+  ''' Копит шаги хода и выводит их пачкой раз в frame секунд: все шаги кадра попадают
+  в одно обновление страницы с одной прокруткой. Открытыми остаются только последние
+  keep_open шагов, остальные сворачиваются.
+  '''
+  def __init__(
+    self,
+    container: ui.element,
+    frame: float = UI_STEP_FRAME,
+    keep_open: int = UI_STEP_KEEP_OPEN
+  ):
+    self.container = container
+    self.frame = frame
+    self.keep_open = keep_open
+    self.pending: list[Step] = []
+    self.opened: list[ui.expansion] = []
+    self.handle: asyncio.TimerHandle | None = None
+
+
+  def add(self, step: Step):
+    self.pending.append(step)
+    if self.handle is None:
+      self.handle = asyncio.get_running_loop().call_later(self.frame, self.flush)
+
+
+  def flush(self):
+    if self.handle is not None:
+      self.handle.cancel()
+      self.handle = None
+    if not self.pending or self.container.is_deleted:
+      self.pending.clear()
+      return
+
+    pending, self.pending = self.pending, []
+    with self.container:
+      # Шаги, которые всё равно свернулись бы, сразу создаются свёрнутыми
+      for i, step in enumerate(pending):
+        opened = i >= len(pending) - self.keep_open
+        exp = render_step(step.title, step.icon, ui_step(step), opened=opened)
+        if opened:
+          self.opened.append(exp)
+      while len(self.opened) > self.keep_open:
+        self.opened.pop(0).value = False
+      ui.run_javascript('window.scrollTo(0, document.body.scrollHeight)')
@@ -3,6 +3,8 @@ from datetime import timedelta
 from functools import wraps
 import humanize
 
+from metrics import metrics
+
 def how_long(resolution='seconds'):
   def _decorator(func):
     @wraps(func)
@@ -11,6 +13,7 @@ def how_long(resolution='seconds'):
       result = await func(*args, **kwargs)
       end_time = time.perf_counter()
       total_time = end_time - start_time
+      metrics.observe('func', total_time, func=func.__name__)
       interval = humanize.precisedelta(
         timedelta(seconds=total_time), 
         minimum_unit=resolution,
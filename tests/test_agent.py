@@ -0,0 +1,62 @@
+import asyncio
+import uuid
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+import agent
+import memory
+from agent import Context, NullSteps, ask, history
+
+
+class PlainMasker:
+  ''' Маскирование без анализатора: граф проверяется отдельно от Presidio. '''
+  comp = None
+
+  def mask(self, text: str) -> str:
+    return text
+
+  def unmask(self, text: str) -> str:
+    return text
+
+
+def model(*answers: str) -> GenericFakeChatModel:
+  return GenericFakeChatModel(messages=iter([AIMessage(content=a) for a in answers]))
+
+
+def test_summary_runs_after_the_answer(monkeypatch):
+  monkeypatch.setattr(agent, 'HISTORY_SUMMARIZE_AFTER', 3)
+  monkeypatch.setattr(memory, 'HISTORY_KEEP_MESSAGES', 2)
+  thread = uuid.uuid4().hex
+  context = Context(
+    llm=model('первый', 'второй'),
+    masker=PlainMasker(),
+    steps=NullSteps(),
+    summarizer=model('пересказ'),
+  )
+
+  async def run():
+    assert await ask('раз', thread, context) == 'первый'
+    assert thread not in agent.summaries
+    assert await ask('два', thread, context) == 'второй'
+    # Ответ уже отдан, пересказ ещё идёт
+    task = agent.summaries[thread]
+    await task
+    return await agent.get_graph().aget_state({'configurable': {'thread_id': thread}})
+
+  state = asyncio.run(run())
+
+  assert state.values['summary'] == 'пересказ'
+  assert [m.text() for m in state.values['messages']] == ['два', 'второй']
+
+
+def test_history_lists_questions_and_answers():
+  thread = uuid.uuid4().hex
+  context = Context(llm=model('первый', 'второй'), masker=PlainMasker(), steps=NullSteps())
+
+  async def run():
+    await ask('раз', thread, context)
+    await ask('два', thread, context)
+    return await history(thread)
+
+  assert asyncio.run(run()) == [('раз', 'первый'), ('два', 'второй')]
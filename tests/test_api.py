@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import agent
+import api
+
+
+def test_new_thread_gets_a_compendium(monkeypatch):
+  async def history(thread_id):
+    return []
+  monkeypatch.setattr(agent, 'history', history)
+
+  comp = asyncio.run(api.session_compendium('new-thread'))
+
+  assert api.sessions.get('new-thread') is comp
+
+
+def test_expired_thread_with_history_is_refused(monkeypatch):
+  async def history(thread_id):
+    return [('⟪PII:PERSON:abcd⟫?', 'ответ')]
+  monkeypatch.setattr(agent, 'history', history)
+  monkeypatch.setattr(api, 'get_store', lambda: None)
+
+  with pytest.raises(HTTPException) as e:
+    asyncio.run(api.session_compendium('expired-thread'))
+
+  assert e.value.status_code == 410
+
+
+@pytest.mark.parametrize('entities', [[], ['UNKNOWN']])
+def test_bad_entities_are_rejected(entities):
+  client = TestClient(api.app)
+
+  response = client.post('/v1/ask', json={'message': 'привет', 'entities': entities})
+
+  assert response.status_code == 422
@@ -0,0 +1,43 @@
+from dataclasses import FrozenInstanceError, replace
+from datetime import datetime, UTC
+
+import pytest
+
+from calendar_parse import parse_events
+
+
+ITEM = {
+  'id': 'e1',
+  'start': {'dateTime': '2025-03-03T13:00:00+03:00'},
+  'end': {'dateTime': '2025-03-03T14:00:00+03:00'},
+  'updated': '2025-03-01T08:00:00Z',
+  'summary': 'Обед',
+  'location': 'Москва',
+}
+
+
+def test_parses_fields_to_utc():
+  [event] = parse_events([ITEM]).values()
+
+  assert event.uid == 'e1'
+  assert event.dtstart == datetime(2025, 3, 3, 10, tzinfo=UTC)
+  assert event.last_modified == datetime(2025, 3, 1, 8, tzinfo=UTC)
+  assert (event.summary, event.location, event.rrule) == ('Обед', 'Москва', '')
+
+
+def test_missing_updated():
+  item = {k: v for k, v in ITEM.items() if k != 'updated'}
+
+  assert parse_events([item])['e1'].last_modified is None
+
+
+def test_event_is_immutable_and_copies_rehash():
+  event = parse_events([ITEM])['e1']
+  before = event.hash
+
+  with pytest.raises(FrozenInstanceError):
+    event.summary = 'Ужин'
+
+  changed = replace(event, summary='Ужин')
+  assert changed.hash != before
+  assert event.hash == before
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, UTC
+from dataclasses import replace
+
+from calendar_event import CalendarEvent
+from calendar_sync import SyncPlan, diff_events, apply_plan
+
+
+START = datetime(2025, 3, 3, 10, tzinfo=UTC)
+
+
+def event(uid: str, summary: str = 'Встреча', **kwargs) -> CalendarEvent:
+  return CalendarEvent(
+    uid=uid,
+    dtstart=START,
+    dtend=START + timedelta(hours=1),
+    last_modified=None,
+    summary=summary,
+    **kwargs
+  )
+
+
+class FakeTarget:
+  def __init__(self):
+    self.calls = []
+
+
+  def create_event(self, event: CalendarEvent) -> str:
+    self.calls.append(('create', event.uid))
+    return f'remote-{event.uid}'
+
+
+  def update_event(self, event_id: str, event: CalendarEvent) -> None:
+    self.calls.append(('update', event_id))
+
+
+  def delete_event(self, event_id: str) -> None:
+    self.calls.append(('delete', event_id))
+
+
+def test_diff_events_finds_create_update_delete():
+  local = [event('a'), event('b', 'Обед'), event('c')]
+  remote = [event('b', 'Ужин'), event('c'), event('d')]
+
+  plan = diff_events(local, remote)
+
+  assert [e.uid for e in plan.create] == ['a']
+  assert [e.uid for e in plan.update] == ['b']
+  assert plan.delete == ['d']
+  assert len(plan) == 3
+
+
+def test_diff_events_ignores_last_modified():
+  local = event('a')
+  remote = replace(local, last_modified=START)
+
+  assert not diff_events([local], [remote])
+
+
+def test_apply_plan_uses_remote_ids():
+  target = FakeTarget()
+  plan = SyncPlan(create=[event('a')], update=[event('b')], delete=['c'])
+
+  ids = apply_plan(target, plan, {'b': 'remote-b', 'c': 'remote-c'})
+
+  assert target.calls == [('create', 'a'), ('update', 'remote-b'), ('delete', 'remote-c')]
+  assert ids == {'a': 'remote-a', 'b': 'remote-b'}
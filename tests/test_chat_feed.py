@@ -0,0 +1,37 @@
+from nicegui import ui
+from nicegui.client import Client
+from nicegui.page import page
+
+from chat_feed import ChatFeed
+
+
+def test_unanswered_turn_stays_live():
+  with Client(page('/'), request=None):
+    feed = ChatFeed(ui.column(), window=2, page=2)
+    first_message, first = feed.ask('первый')
+    later = [feed.ask(f'вопрос {i}')[1] for i in range(3)]
+    for handle in later:
+      feed.answer(handle, 'ответ')
+
+    # Первый ход ещё отвечается: ни он, ни следующие не архивированы
+    assert not first_message.is_deleted
+    assert len(feed.live) == 4 and not feed.archive
+
+    feed.answer(first, 'ответ')
+
+    assert [t.question for _, t in feed.live] == ['вопрос 1', 'вопрос 2']
+    assert [t.question for t in feed.archive] == ['первый', 'вопрос 0']
+    assert first_message.is_deleted
+
+
+def test_restore_archives_beyond_window():
+  with Client(page('/'), request=None):
+    feed = ChatFeed(ui.column(), window=2, page=2)
+    feed.restore([(f'вопрос {i}', f'ответ {i}') for i in range(5)])
+
+    assert [t.question for _, t in feed.live] == ['вопрос 3', 'вопрос 4']
+    assert len(feed.archive) == 3
+
+    feed.load_earlier()
+
+    assert [t.question for _, t in feed.live] == ['вопрос 1', 'вопрос 2', 'вопрос 3', 'вопрос 4']
@@ -0,0 +1,66 @@
+import threading
+
+from compendium import Compendium, Substitution, PIIKind, TOKEN_RE
+
+
+def add(comp: Compendium, kind: PIIKind = PIIKind.PERSON) -> str:
+  token = comp.make_token(kind)
+  comp.add(Substitution(text='x', lemma='x', kind=kind, token=token))
+  return token
+
+
+def test_token_format():
+  comp = Compendium(id_length=4)
+
+  token = comp.make_token(PIIKind.LOCATION)
+
+  assert TOKEN_RE.fullmatch(token)
+  assert token.startswith('⟪PII:LOCATION:') and len(token) == len('⟪PII:LOCATION:⟫') + 4
+
+
+def test_ids_grow_with_the_compendium():
+  comp = Compendium(id_length=1)
+
+  tokens = {add(comp) for _ in range(500)}
+
+  assert len(tokens) == 500
+  # Занято не больше 1/16 пространства id
+  assert 36 ** comp.id_length >= 16 * 500
+
+
+def test_issued_but_unadded_token_is_not_reissued():
+  comp = Compendium(id_length=1)
+
+  tokens = {comp.make_token(PIIKind.PERSON) for _ in range(100)}
+
+  assert len(tokens) == 100
+
+
+def test_cleared_ids_are_not_reissued():
+  comp = Compendium(id_length=1)
+  before = {add(comp) for _ in range(50)}
+
+  comp.clear()
+  after = {add(comp) for _ in range(50)}
+
+  assert not before & after
+  assert comp.get(next(iter(before))) is None
+
+
+def test_concurrent_make_token():
+  comp = Compendium(id_length=2)
+  tokens: list[str] = []
+  lock = threading.Lock()
+
+  def fill():
+    local = [add(comp) for _ in range(500)]
+    with lock:
+      tokens.extend(local)
+
+  threads = [threading.Thread(target=fill) for _ in range(8)]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+
+  assert len(set(tokens)) == len(tokens) == len(comp.dictionary) == 4000
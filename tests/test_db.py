@@ -0,0 +1,42 @@
+import pytest
+
+from db import Table
+
+
+@pytest.mark.parametrize('mutate', [
+  lambda t: t.__setitem__('c', 3),
+  lambda t: t.__delitem__('a'),
+  lambda t: t.update(c=3),
+  lambda t: t.__ior__({'c': 3}),
+  lambda t: t.setdefault('c', 3),
+  lambda t: t.pop('a'),
+  lambda t: t.popitem(),
+  lambda t: t.clear(),
+])
+def test_mutation_bumps_version(mutate):
+  table = Table(a=1, b=2)
+
+  mutate(table)
+
+  assert table.version == 1
+
+
+def test_ior_returns_same_table():
+  table = Table(a=1)
+  table |= {'b': 2}
+
+  assert isinstance(table, Table)
+  assert table == {'a': 1, 'b': 2} and table.version == 1
+
+
+def test_no_change_keeps_version():
+  table = Table(a=1)
+
+  assert table.setdefault('a', 5) == 1
+  assert table.pop('missing', None) is None
+  with pytest.raises(KeyError):
+    table.pop('missing')
+  with pytest.raises(KeyError):
+    Table().popitem()
+
+  assert table.version == 0
@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime, timedelta, UTC
+
+import gcal
+import tools
+from calendar_event import CalendarEvent
+from compendium import Compendium, Substitution, PIIKind
+from event_masking import EventMasker
+
+
+START = datetime(2025, 3, 3, 10, tzinfo=UTC)
+
+
+class FakeMasker:
+  ''' Маскирует имена из списка без анализатора. '''
+  def __init__(self, comp: Compendium, names: list[str]):
+    self.comp = comp
+    self.names = names
+    self.calls = 0
+
+
+  def mask_batch(self, texts: list[str]) -> list[str]:
+    self.calls += 1
+    result = []
+    for text in texts:
+      for name in self.names:
+        if name in text:
+          token = self.comp.make_token(PIIKind.PERSON)
+          self.comp.add(Substitution(text=name, lemma=name, kind=PIIKind.PERSON, token=token))
+          text = text.replace(name, token)
+      result.append(text)
+    return result
+
+
+def event(summary: str, uid: str = 'e1', **kwargs) -> CalendarEvent:
+  return CalendarEvent(
+    uid=uid,
+    dtstart=START,
+    dtend=START + timedelta(hours=1),
+    last_modified=None,
+    summary=summary,
+    **kwargs
+  )
+
+
+def test_unchanged_events_are_masked_once():
+  masker = FakeMasker(Compendium(), ['Иван'])
+  events = EventMasker(masker)
+
+  first = events.mask_events([event('Встреча с Иван')])
+  second = events.mask_events([event('Встреча с Иван')])
+
+  assert first == second
+  assert 'Иван' not in first[0].summary
+  assert masker.calls == 1
+
+
+def test_hit_after_clear_restores_substitutions():
+  comp = Compendium()
+  events = EventMasker(FakeMasker(comp, ['Иван']))
+  [masked] = events.mask_events([event('Встреча с Иван')])
+  [token] = comp.dictionary
+
+  comp.clear()
+  assert events.mask_events([event('Встреча с Иван')]) == [masked]
+  assert comp.get(token).text == 'Иван'
+
+
+def test_token_like_text_in_event():
+  comp = Compendium()
+  events = EventMasker(FakeMasker(comp, []))
+  source = event('Обсудить ⟪PII:PERSON:zzzz⟫')
+
+  events.mask_events([source])
+  comp.clear()
+
+  assert events.mask_events([source])[0].summary == source.summary
+
+
+def test_entry_is_dropped_when_token_means_another_entity():
+  comp = Compendium()
+  masker = FakeMasker(comp, ['Иван'])
+  events = EventMasker(masker)
+  [masked] = events.mask_events([event('Встреча с Иван')])
+  [token] = comp.dictionary
+
+  comp.clear()
+  comp.add(Substitution(text='Пётр', lemma='Пётр', kind=PIIKind.PERSON, token=token))
+  [again] = events.mask_events([event('Встреча с Иван')])
+
+  assert masker.calls == 2
+  assert token not in again.summary
+  assert comp.get(again.summary.removeprefix('Встреча с ')).text == 'Иван'
+
+
+def test_show_schedule_returns_masked_occurrences(monkeypatch):
+  comp = Compendium()
+  series = event('Планёрка с Иван', uid='s', rrule='FREQ=DAILY;COUNT=3', location='Офис')
+
+  async def list_events(calendar_id, from_date, to_date):
+    return {series.uid: series}
+
+  monkeypatch.setattr(gcal, 'list_events', list_events)
+  monkeypatch.setattr(tools, 'event_masker', lambda: EventMasker(FakeMasker(comp, ['Иван'])))
+
+  lines = asyncio.run(tools.show_schedule.coroutine(START, START + timedelta(days=2)))
+
+  assert len(lines) == 2
+  assert lines[0].startswith('2025-03-03 10:00–11:00 | Планёрка с ⟪PII:PERSON:')
+  assert lines[0].endswith('| Офис')
+  assert all('Иван' not in line for line in lines)
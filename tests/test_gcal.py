@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import gcal
+
+
+class FakeCreds:
+  ''' Как google-auth: refresh обновляет тот же объект. '''
+  def __init__(self, expiry: datetime):
+    self.expiry = expiry
+    self.refresh_token = 'refresh'
+    self.refreshes = 0
+
+
+  @property
+  def valid(self) -> bool:
+    return self.expiry > datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+  def refresh(self, request):
+    self.refreshes += 1
+    self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+
+def patch(monkeypatch, creds: FakeCreds):
+  monkeypatch.setattr(gcal, '_load_creds', lambda: creds)
+  monkeypatch.setattr(gcal, '_save_creds', lambda c: None)
+  monkeypatch.setattr(gcal, 'Request', lambda: None)
+  monkeypatch.setattr(gcal, '_to_aiogoogle', lambda c: c)
+
+
+def test_concurrent_waiters_refresh_once(monkeypatch):
+  creds = FakeCreds(datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(minutes=1))
+  patch(monkeypatch, creds)
+  provider = gcal.CredentialProvider()
+
+  async def run():
+    return await asyncio.gather(*(provider.get() for _ in range(10)))
+
+  results = asyncio.run(run())
+
+  assert creds.refreshes == 1
+  assert all(r is creds for r in results)
+
+
+def test_background_refresh_error_is_reported(monkeypatch, capsys):
+  creds = FakeCreds(datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1))
+  patch(monkeypatch, creds)
+  provider = gcal.CredentialProvider()
+
+  def fail(request):
+    raise RuntimeError('network down')
+
+  async def run():
+    await provider.get()
+    creds.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(minutes=1)
+    creds.refresh = fail
+    # Токен скоро истечёт: отдаётся текущий, обновление уходит в фон
+    assert await provider.get() is creds
+    await asyncio.wait({provider._refresh_task})
+
+  asyncio.run(run())
+
+  assert 'network down' in capsys.readouterr().out
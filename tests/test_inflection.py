@@ -0,0 +1,67 @@
+import pytest
+import pymorphy3
+
+from compendium import Compendium, Substitution, PIIKind
+from inflection import Inflector, match_case
+
+
+@pytest.fixture(scope='module')
+def inflector() -> Inflector:
+  return Inflector(pymorphy3.MorphAnalyzer())
+
+
+@pytest.fixture
+def comp() -> Compendium:
+  comp = Compendium()
+  for token, text, lemma, kind in [
+    ('⟪PII:PERSON:a⟫', 'Петр Емельянов', 'пётр емельянов', PIIKind.PERSON),
+    ('⟪PII:PERSON:b⟫', 'Анна Иванова', 'анна иванова', PIIKind.PERSON),
+    ('⟪PII:PERSON:c⟫', 'Ивановой', 'иванов', PIIKind.PERSON),
+    ('⟪PII:LOCATION:d⟫', 'Урал', 'урал', PIIKind.LOCATION),
+    ('⟪PII:LOCATION:e⟫', 'Ростов-на-Дону', 'ростов-на-дону', PIIKind.LOCATION),
+  ]:
+    comp.add(Substitution(text=text, lemma=lemma, kind=kind, token=token))
+  return comp
+
+
+@pytest.mark.parametrize('text, case', [
+  ('⟪', 'nomn'),
+  ('Ответ. ⟪', 'nomn'),
+  ('- ⟪', 'nomn'),
+  ('возраст у ⟪', 'gent'),
+  ('письмо к ⟪', 'datv'),
+  ('старше, чем ⟪', 'nomn'),
+  ('старше ⟪', 'gent'),
+  # Падеж после «с», «под», «в» и «на» неоднозначен
+  ('приехал с ⟪', None),
+  ('лежит под ⟪', None),
+  ('живёт в ⟪', None),
+  ('встреча, ⟪', None),
+])
+def test_case_at(inflector, text, case):
+  assert inflector.case_at(text, len(text) - 1) == case
+
+
+def test_female_surname_without_first_name(inflector):
+  assert inflector.inflect('иванов', 'Ивановой', PIIKind.PERSON, frozenset({'datv'})) == 'ивановой'
+  # «Иванова» – и мужской родительный, и женский именительный: пол не определить
+  assert inflector.inflect('иванов', 'Иванова', PIIKind.PERSON, frozenset({'datv'})) is None
+
+
+def test_hyphenated_place(inflector):
+  form = inflector.inflect('ростов-на-дону', 'Ростов-на-Дону', PIIKind.LOCATION, frozenset({'gent'}))
+
+  assert match_case('Ростов-на-Дону', form) == 'Ростова-на-Дону'
+
+
+@pytest.mark.parametrize('text, expected', [
+  ('Он приехал с ⟪PII:LOCATION:d⟫.', 'Он приехал с Урал.'),
+  ('Кроме ⟪PII:PERSON:a⟫, ⟪PII:PERSON:b⟫ пришла.', 'Кроме Петра Емельянова, Анна Иванова пришла.'),
+  ('У ⟪PII:PERSON:a⟫, ⟪PII:PERSON:b⟫ и ⟪PII:PERSON:c⟫ есть дом.', 'У Петра Емельянова, Анны Ивановой и Ивановой есть дом.'),
+  ('К ⟪PII:PERSON:b⟫ или ⟪PII:PERSON:a⟫.', 'К Анне Ивановой или Петру Емельянову.'),
+  ('Письмо для ⟪PII:PERSON:c⟫ из ⟪PII:LOCATION:e⟫.', 'Письмо для Ивановой из Ростова-на-Дону.'),
+  ('⟪PII:PERSON:a⟫ старше ⟪PII:PERSON:b⟫.', 'Петр Емельянов старше Анны Ивановой.'),
+  ('Неизвестный ⟪PII:PERSON:zz⟫ остаётся.', 'Неизвестный ⟪PII:PERSON:zz⟫ остаётся.'),
+])
+def test_reconstruct(inflector, comp, text, expected):
+  assert inflector.reconstruct(comp, text) == expected
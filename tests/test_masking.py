@@ -0,0 +1,37 @@
+import pytest
+from presidio_analyzer import RecognizerResult
+
+from masking import check_entities, non_overlapping
+
+
+def span(entity: str, start: int, end: int, score: float) -> RecognizerResult:
+  return RecognizerResult(entity_type=entity, start=start, end=end, score=score)
+
+
+def test_non_overlapping_keeps_the_more_confident_span():
+  url = span('URL', 6, 20, 0.5)
+  email = span('EMAIL_ADDRESS', 0, 20, 1.0)
+  person = span('PERSON', 25, 30, 0.85)
+
+  assert non_overlapping([url, person, email]) == [email, person]
+
+
+def test_non_overlapping_prefers_the_longer_span_on_equal_score():
+  short = span('PERSON', 0, 4, 0.85)
+  long = span('PERSON', 0, 14, 0.85)
+
+  assert non_overlapping([short, long]) == [long]
+
+
+def test_non_overlapping_keeps_adjacent_spans_in_order():
+  spans = [span('PERSON', 10, 15, 0.6), span('LOCATION', 0, 10, 0.9)]
+
+  assert [s.start for s in non_overlapping(spans)] == [0, 10]
+
+
+def test_check_entities():
+  check_entities(['PERSON', 'PHONE_NUMBER'])
+  with pytest.raises(ValueError, match='UNKNOWN'):
+    check_entities(['PERSON', 'UNKNOWN'])
+  with pytest.raises(ValueError):
+    check_entities([])
@@ -0,0 +1,45 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+from memory import PromptTooLong, prompt_window, shorten
+
+
+def turn(question: str, result: str, answer: str) -> list:
+  return [
+    HumanMessage(content=question),
+    AIMessage(content='', tool_calls=[{'name': 'age', 'args': {'t': '⟪PII:PERSON:a⟫'}, 'id': '1'}]),
+    ToolMessage(content=result, tool_call_id='1'),
+    AIMessage(content=answer),
+  ]
+
+
+def test_shorten_keeps_tokens_whole():
+  text = 'возраст ⟪PII:PERSON:abcd⟫ – ⟪PII:NUMBER:ef01⟫ лет'
+
+  short = shorten(text, 12)
+
+  assert short.startswith('возраст ')
+  assert '⟪PII:PERSON:abcd⟫' in short and '⟪PII:NUMBER:ef01⟫' in short
+
+
+def test_window_drops_old_turns_first():
+  messages = turn('раз', 'x' * 200, 'ответ') + turn('два', 'y' * 200, 'ответ')
+
+  window = prompt_window(messages, 120, count_tokens_approximately)
+
+  assert window[0].content == 'два'
+
+
+def test_oversized_turn_compacts_last_tool_result():
+  messages = turn('раз', 'x' * 4000, 'ответ')
+
+  window = prompt_window(messages, 300, count_tokens_approximately)
+
+  assert len(window[2].content) < 400
+  assert count_tokens_approximately(window) <= 300
+
+
+def test_oversized_question_raises():
+  with pytest.raises(PromptTooLong):
+    prompt_window([HumanMessage(content='слово ' * 2000)], 300, count_tokens_approximately)
@@ -0,0 +1,20 @@
+from metrics import RingBufferSink, Sample
+
+
+def sample(value: float, unit: str = 'seconds', **labels) -> Sample:
+  return Sample(name='node', value=value, trace_id=None, unit=unit, labels=labels)
+
+
+def test_summary_keeps_series_apart():
+  sink = RingBufferSink()
+  for v in (1.0, 2.0, 3.0):
+    sink.emit(sample(v, node='llm'))
+  sink.emit(sample(0.01, node='mask'))
+  sink.emit(sample(500, unit='tokens', node='llm'))
+
+  summary = {(s['unit'], s['labels']['node']): s for s in sink.summary()}
+
+  assert set(summary) == {('seconds', 'llm'), ('seconds', 'mask'), ('tokens', 'llm')}
+  assert summary['seconds', 'llm']['count'] == 3
+  assert summary['seconds', 'llm']['p50'] == 2.0
+  assert summary['tokens', 'llm']['p99'] == 500
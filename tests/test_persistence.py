@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from cryptography.fernet import Fernet
+
+from compendium import Substitution, PIIKind
+from persistence import CompendiumStore
+
+
+def person(i: int) -> Substitution:
+  return Substitution(text=f'Имя {i}', lemma=f'имя {i}', kind=PIIKind.PERSON, token=f'⟪PII:PERSON:{i:04x}⟫')
+
+
+@pytest.fixture
+def store(tmp_path) -> CompendiumStore:
+  return CompendiumStore(tmp_path, [Fernet.generate_key()], snapshot_every=4)
+
+
+def test_round_trip_through_snapshot_and_log(store):
+  comp = store.open('s')
+  for i in range(10):
+    comp.add(person(i))
+  store.flush()
+
+  # 8 записей ушли в снимок, 2 остались в журнале
+  assert comp.journal.pending == 2
+  reloaded = store.open('s')
+
+  assert reloaded.dictionary == comp.dictionary
+  assert reloaded.journal.pending == 2
+
+
+def test_files_are_encrypted(store, tmp_path):
+  comp = store.open('s')
+  for i in range(5):
+    comp.add(person(i))
+  store.flush()
+
+  data = b''.join(p.read_bytes() for p in tmp_path.iterdir())
+  assert 'Имя'.encode() not in data
+  assert all(len(p.stem) == 32 for p in tmp_path.iterdir())
+
+
+def test_clear_resets_journal(store):
+  comp = store.open('s')
+  for i in range(3):
+    comp.add(person(i))
+  comp.clear()
+  comp.add(person(7))
+  store.flush()
+
+  assert list(store.open('s').dictionary) == [person(7).token]
+
+
+def test_torn_last_line_is_skipped(store):
+  comp = store.open('s')
+  comp.add(person(1))
+  store.flush()
+  with open(comp.journal.wal, 'ab') as f:
+    f.write(b'gAAAA-torn')
+
+  assert list(store.open('s').dictionary) == [person(1).token]
+
+
+def test_concurrent_adds_with_compaction(tmp_path):
+  store = CompendiumStore(tmp_path, [Fernet.generate_key()], snapshot_every=50)
+  comp = store.open('s')
+
+  def fill(start: int):
+    for i in range(start, start + 200):
+      comp.add(person(i))
+
+  with ThreadPoolExecutor(max_workers=4) as pool:
+    list(pool.map(fill, range(0, 800, 200)))
+  store.flush()
+
+  assert len(store.open('s').dictionary) == 800
+
+
+def test_key_rotation_reads_old_files(tmp_path):
+  old = Fernet.generate_key()
+  comp = CompendiumStore(tmp_path, [old]).open('s')
+  comp.add(person(1))
+  comp.journal.flush()
+
+  rotated = CompendiumStore(tmp_path, [Fernet.generate_key(), old])
+
+  assert list(rotated.open('s').dictionary) == [person(1).token]
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta, UTC
+
+from calendar_event import CalendarEvent
+from calendar_parse import parse_events
+from recurrence import RecurrenceExpander
+
+
+START = datetime(2025, 3, 3, 10, tzinfo=UTC)
+WEEK = timedelta(weeks=1)
+
+
+def series(**kwargs) -> CalendarEvent:
+  return CalendarEvent(
+    uid='s',
+    dtstart=START,
+    dtend=START + timedelta(hours=1),
+    last_modified=None,
+    summary='Планёрка',
+    rrule='FREQ=WEEKLY;COUNT=4',
+    **kwargs
+  )
+
+
+def exception(dt: datetime, **kwargs) -> CalendarEvent:
+  return CalendarEvent(
+    uid=f's_{dt:%Y%m%d}',
+    dtstart=kwargs.pop('dtstart', dt),
+    dtend=kwargs.pop('dtend', dt + timedelta(hours=1)),
+    last_modified=None,
+    summary='Планёрка',
+    parent_uid='s',
+    recurrence_id=dt.isoformat(),
+    **kwargs
+  )
+
+
+def test_expands_series_in_window():
+  expander = RecurrenceExpander([series()])
+
+  events = expander.schedule(START, START + 10 * WEEK)
+
+  assert [e.dtstart for e in events] == [START + i * WEEK for i in range(4)]
+  assert all(e.parent_uid == 's' and not e.is_recurring for e in events)
+
+
+def test_occurrence_running_into_window_is_included():
+  expander = RecurrenceExpander([series()])
+
+  events = expander.schedule(START + timedelta(minutes=30), START + timedelta(days=1))
+
+  assert [e.dtstart for e in events] == [START]
+
+
+def test_exception_replaces_occurrence():
+  moved = START + WEEK + timedelta(hours=3)
+  expander = RecurrenceExpander([series(), exception(START + WEEK, dtstart=moved, dtend=moved + timedelta(hours=1))])
+
+  events = expander.schedule(START, START + 10 * WEEK)
+
+  assert [e.dtstart for e in events] == [START, moved, START + 2 * WEEK, START + 3 * WEEK]
+
+
+def test_cancelled_exception_removes_occurrence():
+  expander = RecurrenceExpander([series(), exception(START + WEEK, cancelled=True)])
+
+  events = expander.schedule(START, START + 10 * WEEK)
+
+  assert [e.dtstart for e in events] == [START, START + 2 * WEEK, START + 3 * WEEK]
+
+
+def test_cancelled_instance_from_api():
+  items = [
+    {
+      'id': 's',
+      'start': {'dateTime': '2025-03-03T10:00:00Z'},
+      'end': {'dateTime': '2025-03-03T11:00:00Z'},
+      'summary': 'Планёрка',
+      'recurrence': ['RRULE:FREQ=WEEKLY;COUNT=2'],
+    },
+    {
+      'id': 's_20250310T100000Z',
+      'status': 'cancelled',
+      'recurringEventId': 's',
+      'originalStartTime': {'dateTime': '2025-03-10T10:00:00Z'},
+    },
+  ]
+  expander = RecurrenceExpander(parse_events(items))
+
+  assert [e.dtstart for e in expander.schedule(START, START + 10 * WEEK)] == [START]
+
+
+def test_cache_is_bounded():
+  expander = RecurrenceExpander([series()], maxsize=2)
+
+  for day in range(5):
+    expander.expand('s', START + timedelta(days=day), START + 10 * WEEK)
+
+  assert len(expander._cache) == 2
+
+
+def test_invalidate_drops_series_windows():
+  expander = RecurrenceExpander([series()])
+  expander.expand('s', START, START + WEEK)
+
+  expander.invalidate('s')
+
+  assert not expander._cache
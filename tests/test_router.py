@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import Runnable
+
+from router import RoutedChatModel
+
+
+class Provider(Runnable):
+  def __init__(self, reply: str = 'ok', error: Exception | None = None, delay: float = 0.0):
+    self.reply = reply
+    self.error = error
+    self.delay = delay
+    self.calls: list[dict] = []
+    self.cancelled = False
+
+
+  def invoke(self, input, config=None, **kwargs):
+    self.calls.append(kwargs)
+    if self.error:
+      raise self.error
+    return AIMessage(content=self.reply)
+
+
+  async def ainvoke(self, input, config=None, **kwargs):
+    self.calls.append(kwargs)
+    try:
+      await asyncio.sleep(self.delay)
+    except asyncio.CancelledError:
+      self.cancelled = True
+      raise
+    if self.error:
+      raise self.error
+    return AIMessage(content=self.reply)
+
+
+def routed(*providers: Provider, **kwargs) -> RoutedChatModel:
+  return RoutedChatModel(names=[f'p{i}' for i in range(len(providers))], models=list(providers), **kwargs)
+
+
+MESSAGES = [HumanMessage(content='привет')]
+
+
+def test_falls_back_on_error_and_passes_stop():
+  first, second = Provider(error=RuntimeError('down')), Provider('запасной')
+  model = routed(first, second)
+
+  response = asyncio.run(model.ainvoke(MESSAGES, stop=['\n']))
+
+  assert response.content == 'запасной'
+  assert first.calls[0]['stop'] == second.calls[0]['stop'] == ['\n']
+  assert model.stats()['p0']['errors'] == 1
+
+
+def test_falls_back_on_timeout():
+  model = routed(Provider(delay=1.0), Provider('запасной'), timeout=0.05)
+
+  assert asyncio.run(model.ainvoke(MESSAGES)).content == 'запасной'
+  assert model.stats()['p0']['timeouts'] == 1
+
+
+def test_sync_path_falls_back():
+  model = routed(Provider(error=RuntimeError('down')), Provider('запасной'))
+
+  assert model.invoke(MESSAGES, stop=['.']).content == 'запасной'
+
+
+def test_tripped_provider_moves_to_the_end():
+  first = Provider(error=RuntimeError('down'))
+  model = routed(first, Provider('запасной'))
+  for _ in range(3):
+    asyncio.run(model.ainvoke(MESSAGES))
+
+  assert model.route() == [1, 0]
+
+
+def test_hedge_takes_the_faster_provider():
+  slow, fast = Provider('медленный', delay=1.0), Provider('быстрый')
+  model = routed(slow, fast, hedge=True, hedge_default_delay=0.05)
+
+  assert asyncio.run(model.ainvoke(MESSAGES)).content == 'быстрый'
+  assert slow.cancelled
+
+
+def test_cancelled_caller_cancels_the_primary():
+  slow = Provider(delay=1.0)
+  model = routed(slow, Provider(), hedge=True, hedge_default_delay=0.5)
+
+  async def run():
+    task = asyncio.create_task(model.ainvoke(MESSAGES))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+      await task
+    await asyncio.sleep(0)
+    # До остановки цикла: asyncio.run отменил бы оставшиеся задачи сам
+    assert slow.cancelled
+
+  asyncio.run(run())